@@ -1,5 +1,7 @@
 import pandas as pd
 from datetime import datetime
+from agents.detections import detect_port_scans, detect_beacons
+from metrics import stage
 
 def generate_alerts(df):
     """
@@ -20,75 +22,98 @@ def generate_alerts(df):
         conn_df = df[df["_path"] == "conn"]
 
         # Failed or reset connections
-        if "conn_state" in conn_df:
-            failed = conn_df[conn_df["conn_state"].isin(["S0", "REJ", "RSTO"])]
-            for _, row in failed.iterrows():
-                alerts.append({
-                    "ts": row.get("ts"),
-                    "type": "Failed Connection",
-                    "desc": f"Connection {row.get('id.orig_h')} | {row.get('id.resp_h')} failed ({row.get('conn_state')})"
-                })
+        with stage("detect.failed_connection", rows_in=len(conn_df)) as s:
+            if "conn_state" in conn_df:
+                failed = conn_df[conn_df["conn_state"].isin(["S0", "REJ", "RSTO"])]
+                s.rows_out = len(failed)
+                for _, row in failed.iterrows():
+                    alerts.append({
+                        "ts": row.get("ts"),
+                        "type": "Failed Connection",
+                        "desc": f"Connection {row.get('id.orig_h')} | {row.get('id.resp_h')} failed ({row.get('conn_state')})"
+                    })
 
         # High data transfer
-        if "orig_bytes" in conn_df and "resp_bytes" in conn_df:
-            high_transfer = conn_df[
-                (conn_df["resp_bytes"] > 5e6) | (conn_df["orig_bytes"] > 5e6)
-            ]
-            for _, row in high_transfer.iterrows():
-                alerts.append({
-                    "ts": row.get("ts"),
-                    "type": "High Data Transfer",
-                    "desc": f"High transfer {row.get('id.orig_h')} | {row.get('id.resp_h')} ({row.get('resp_bytes')} bytes)"
-                })
+        with stage("detect.high_data_transfer", rows_in=len(conn_df)) as s:
+            if "orig_bytes" in conn_df and "resp_bytes" in conn_df:
+                high_transfer = conn_df[
+                    (conn_df["resp_bytes"] > 5e6) | (conn_df["orig_bytes"] > 5e6)
+                ]
+                s.rows_out = len(high_transfer)
+                for _, row in high_transfer.iterrows():
+                    alerts.append({
+                        "ts": row.get("ts"),
+                        "type": "High Data Transfer",
+                        "desc": f"High transfer {row.get('id.orig_h')} | {row.get('id.resp_h')} ({row.get('resp_bytes')} bytes)"
+                    })
+
+        # Port scans and periodic beacons (batch, per source / per flow)
+        with stage("detect.port_scan", rows_in=len(conn_df)) as s:
+            scans = detect_port_scans(conn_df)
+            s.rows_out = len(scans)
+            alerts.extend(scans.to_dict(orient="records"))
+        with stage("detect.beacon", rows_in=len(conn_df)) as s:
+            beacons = detect_beacons(conn_df)
+            s.rows_out = len(beacons)
+            alerts.extend(beacons.to_dict(orient="records"))
 
     # 2️⃣ SSH events
     if "_path" in df.columns and "ssh" in df["_path"].unique():
         ssh_df = df[df["_path"] == "ssh"]
-        if "auth_attempts" in ssh_df:
-            brute_force = ssh_df[ssh_df["auth_attempts"] > 5]
-            for _, row in brute_force.iterrows():
-                alerts.append({
-                    "ts": row.get("ts"),
-                    "type": "SSH Brute Force",
-                    "desc": f"Multiple SSH auth attempts from {row.get('id.orig_h')} to {row.get('id.resp_h')}"
-                })
+        with stage("detect.ssh_brute_force", rows_in=len(ssh_df)) as s:
+            if "auth_attempts" in ssh_df:
+                brute_force = ssh_df[ssh_df["auth_attempts"] > 5]
+                s.rows_out = len(brute_force)
+                for _, row in brute_force.iterrows():
+                    alerts.append({
+                        "ts": row.get("ts"),
+                        "type": "SSH Brute Force",
+                        "desc": f"Multiple SSH auth attempts from {row.get('id.orig_h')} to {row.get('id.resp_h')}"
+                    })
 
     # 3️⃣ DHCP anomalies
     if "_path" in df.columns and "dhcp" in df["_path"].unique():
         dhcp_df = df[df["_path"] == "dhcp"]
-        if "msg_type" in dhcp_df:
-            rogue = dhcp_df[dhcp_df["msg_type"].str.contains("Offer", case=False, na=False)]
-            rogue_servers = rogue["id.resp_h"].value_counts()
-            if len(rogue_servers) > 1:
-                alerts.append({
-                    "ts": datetime.utcnow(),
-                    "type": "Rogue DHCP Server",
-                    "desc": f"Multiple DHCP servers detected: {', '.join(rogue_servers.index)}"
-                })
+        with stage("detect.rogue_dhcp", rows_in=len(dhcp_df)) as s:
+            s.rows_out = 0
+            if "msg_type" in dhcp_df:
+                rogue = dhcp_df[dhcp_df["msg_type"].str.contains("Offer", case=False, na=False)]
+                rogue_servers = rogue["id.resp_h"].value_counts()
+                if len(rogue_servers) > 1:
+                    s.rows_out = 1
+                    alerts.append({
+                        "ts": datetime.utcnow(),
+                        "type": "Rogue DHCP Server",
+                        "desc": f"Multiple DHCP servers detected: {', '.join(rogue_servers.index)}"
+                    })
 
     # 4️⃣ DNS tunneling
     if "_path" in df.columns and "dns" in df["_path"].unique():
         dns_df = df[df["_path"] == "dns"]
-        if "query" in dns_df:
-            suspicious = dns_df[dns_df["query"].str.contains("base64|.onion|tor", case=False, na=False)]
-            for _, row in suspicious.iterrows():
-                alerts.append({
-                    "ts": row.get("ts"),
-                    "type": "Suspicious DNS Query",
-                    "desc": f"Suspicious query {row.get('query')} from {row.get('id.orig_h')}"
-                })
+        with stage("detect.suspicious_dns", rows_in=len(dns_df)) as s:
+            if "query" in dns_df:
+                suspicious = dns_df[dns_df["query"].str.contains("base64|.onion|tor", case=False, na=False)]
+                s.rows_out = len(suspicious)
+                for _, row in suspicious.iterrows():
+                    alerts.append({
+                        "ts": row.get("ts"),
+                        "type": "Suspicious DNS Query",
+                        "desc": f"Suspicious query {row.get('query')} from {row.get('id.orig_h')}"
+                    })
 
     # 5️⃣ HTTP anomalies
     if "_path" in df.columns and "http" in df["_path"].unique():
         http_df = df[df["_path"] == "http"]
-        if "uri" in http_df:
-            cmd = http_df[http_df["uri"].str.contains("cmd.exe|powershell", case=False, na=False)]
-            for _, row in cmd.iterrows():
-                alerts.append({
-                    "ts": row.get("ts"),
-                    "type": "Suspicious HTTP Request",
-                    "desc": f"Possible C2 via {row.get('uri')} from {row.get('id.orig_h')}"
-                })
+        with stage("detect.suspicious_http", rows_in=len(http_df)) as s:
+            if "uri" in http_df:
+                cmd = http_df[http_df["uri"].str.contains("cmd.exe|powershell", case=False, na=False)]
+                s.rows_out = len(cmd)
+                for _, row in cmd.iterrows():
+                    alerts.append({
+                        "ts": row.get("ts"),
+                        "type": "Suspicious HTTP Request",
+                        "desc": f"Possible C2 via {row.get('uri')} from {row.get('id.orig_h')}"
+                    })
 
     return pd.DataFrame(alerts)
 
@@ -1,4 +1,5 @@
 from utils import load_zeek_logs
+from metrics import stage
 
 import json
 import pandas as pd
@@ -31,13 +32,17 @@ def expand_raw_json(df):
     return expanded_df
 
 def collect_logs(json_path):
-    df = load_zeek_logs(json_path)
+    with stage("ingest") as s:
+        df = load_zeek_logs(json_path)
+        s.rows_out = len(df)
     stats = {
         "rows": len(df),
         "time_range": [str(df["ts"].min()), str(df["ts"].max())],
         "columns": list(df.columns),
         "paths": df["_path"].value_counts().to_dict() if "_path" in df else {},
     }
-    df = expand_raw_json(df)
+    with stage("raw_expansion", rows_in=len(df)) as s:
+        df = expand_raw_json(df)
+        s.rows_out = len(df)
     print(df["_path"].value_counts())
     return df, stats
@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+
+SCAN_WINDOW = "5min"
+SCAN_PORT_THRESHOLD = 100
+SCAN_HOST_THRESHOLD = 50
+
+BEACON_MIN_EVENTS = 10
+BEACON_MAX_CV = 0.15
+BEACON_MIN_INTERVAL = 5.0
+
+
+def _epoch_seconds(ts):
+    """
+    Convert a timestamp column to float seconds since the epoch (NaT -> NaN).
+    """
+    ts = pd.to_datetime(ts, errors="coerce", utc=True)
+    return (ts - pd.Timestamp(0, tz="UTC")).dt.total_seconds().to_numpy()
+
+
+def _from_epoch(secs, tz):
+    """
+    Epoch seconds back to timestamps in the source column's timezone
+    (tz=None gives naive UTC, like a naive source column). Rounded to the
+    microsecond, Zeek's resolution, so float seconds don't add ns noise.
+    """
+    us = np.round(np.asarray(secs, dtype=np.float64) * 1e6).astype(np.int64)
+    ts = pd.to_datetime(us, unit="us", utc=True)
+    return ts.tz_convert(tz) if tz is not None else ts.tz_localize(None)
+
+
+def _source_tz(ts):
+    return ts.dt.tz if pd.api.types.is_datetime64_any_dtype(ts) else None
+
+
+def _codes(values):
+    """
+    Dense integer codes for a column (missing values -> -1).
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    return codes.astype(np.int64), uniques
+
+
+def _sorted_unique(keys):
+    """
+    Unique values of an int64 array via sort + adjacent compare.
+    """
+    keys = np.sort(keys)
+    if len(keys) == 0:
+        return keys
+    return keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+
+
+def _distinct_per_group(group, value, n_values):
+    """
+    Count distinct `value` codes per `group` code using a sorted composite key.
+    Returns (group ids, distinct counts).
+    """
+    groups = _sorted_unique(group * n_values + value) // n_values
+    ids = _sorted_unique(groups)
+    return ids, np.diff(np.searchsorted(groups, ids, side="left"), append=len(groups))
+
+
+def conn_arrays(conn_df):
+    """
+    Pull the coded arrays both detectors need out of a conn partition.
+    Hosts are coded in order of first appearance; rows with no usable
+    time, host or port are dropped. None if a column is missing.
+    """
+    cols = ["ts", "id.orig_h", "id.resp_h", "id.resp_p"]
+    if conn_df is None or conn_df.empty or any(c not in conn_df for c in cols):
+        return None
+
+    secs = _epoch_seconds(conn_df["ts"])
+    port = pd.to_numeric(conn_df["id.resp_p"], errors="coerce").to_numpy()
+    src, src_names = _codes(conn_df["id.orig_h"])
+    dst, dst_names = _codes(conn_df["id.resp_h"])
+
+    valid = (~np.isnan(secs) & (port >= 0) & (port < 65536)
+             & (src >= 0) & (dst >= 0))
+    return {
+        "secs": secs[valid],
+        "port": port[valid].astype(np.int64),
+        "src": src[valid],
+        "dst": dst[valid],
+        "src_names": np.asarray(src_names, dtype=object),
+        "dst_names": np.asarray(dst_names, dtype=object),
+        "tz": _source_tz(conn_df["ts"]),
+    }
+
+
+def scan_alerts(c, window=SCAN_WINDOW, port_threshold=SCAN_PORT_THRESHOLD,
+                host_threshold=SCAN_HOST_THRESHOLD):
+    """
+    Scan alerts over conn_arrays() output: vertical then horizontal, each
+    ordered by source and then time bucket.
+    """
+    empty = pd.DataFrame(columns=["ts", "type", "desc", "id.orig_h", "id.resp_h"])
+    if c is None or len(c["secs"]) == 0:
+        return empty
+
+    width = pd.Timedelta(window).total_seconds()
+    bucket = np.floor(c["secs"] / width).astype(np.int64)
+    bucket -= bucket.min()
+
+    # Compact (src, bucket) into a single group id
+    pairs, group = np.unique(c["src"] * (bucket.max() + 1) + bucket, return_inverse=True)
+    group = group.astype(np.int64)
+    pair_src = pairs // (bucket.max() + 1)
+    pair_bucket = pairs % (bucket.max() + 1)
+
+    port_ids, port_counts = _distinct_per_group(group, c["port"], 65536)
+    host_ids, host_counts = _distinct_per_group(group, c["dst"], len(c["dst_names"]))
+
+    ports = np.zeros(len(pairs), dtype=np.int64)
+    hosts = np.zeros(len(pairs), dtype=np.int64)
+    ports[port_ids] = port_counts
+    hosts[host_ids] = host_counts
+
+    origin = np.floor(np.nanmin(c["secs"]) / width) * width
+    bucket_start = _from_epoch(origin + pair_bucket * width, c["tz"])
+
+    alerts = []
+    for kind, counts, threshold, noun in [
+        ("Vertical Port Scan", ports, port_threshold, "ports"),
+        ("Horizontal Scan", hosts, host_threshold, "hosts"),
+    ]:
+        hit = np.flatnonzero(counts >= threshold)
+        if not len(hit):
+            continue
+        srcs = c["src_names"][pair_src[hit]]
+        alerts.append(pd.DataFrame({
+            "ts": bucket_start[hit],
+            "type": kind,
+            "desc": [f"{s} contacted {n} distinct {noun} within {window}"
+                     for s, n in zip(srcs, counts[hit])],
+            "id.orig_h": srcs,
+            "id.resp_h": "N/A",
+        }))
+
+    if not alerts:
+        return empty
+    return pd.concat(alerts, ignore_index=True)
+
+
+def beacon_alerts(c, min_events=BEACON_MIN_EVENTS, max_cv=BEACON_MAX_CV,
+                  min_interval=BEACON_MIN_INTERVAL):
+    """
+    Beacon alerts over conn_arrays() output, ordered by first connection.
+    """
+    empty = pd.DataFrame(columns=["ts", "type", "desc", "id.orig_h", "id.resp_h"])
+    if c is None or len(c["secs"]) < min_events:
+        return empty
+
+    n_dst = len(c["dst_names"])
+    flow = (c["src"] * n_dst + c["dst"]) * 65536 + c["port"]
+    order = np.lexsort((c["secs"], flow))
+    flow, secs = flow[order], c["secs"][order]
+
+    flows, fid = np.unique(flow, return_inverse=True)
+    fid = fid.astype(np.int64)
+
+    # Inter-arrival gaps within the same flow
+    same = fid[1:] == fid[:-1]
+    gaps = np.diff(secs)[same]
+    gid = fid[1:][same]
+
+    n = np.bincount(gid, minlength=len(flows))
+    total = np.bincount(gid, weights=gaps, minlength=len(flows))
+    sq = np.bincount(gid, weights=gaps * gaps, minlength=len(flows))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / n
+        std = np.sqrt(np.maximum(sq / n - mean * mean, 0.0))
+        cv = std / mean
+
+    hit = np.flatnonzero((n + 1 >= min_events) & (mean >= min_interval) & (cv <= max_cv))
+    if not len(hit):
+        return empty
+
+    first = np.searchsorted(fid, hit)
+    port = flows[hit] % 65536
+    pair = flows[hit] // 65536
+    srcs = c["src_names"][pair // n_dst]
+    dsts = c["dst_names"][pair % n_dst]
+    score = 1.0 - cv[hit] / max_cv
+
+    return pd.DataFrame({
+        "ts": _from_epoch(secs[first], c["tz"]),
+        "type": "Beaconing",
+        "desc": [f"Periodic connections {s}->{d}:{p} every {m:.1f}s "
+                 f"(n={k + 1}, cv={v:.3f}, score={sc:.2f})"
+                 for s, d, p, m, k, v, sc in zip(srcs, dsts, port, mean[hit],
+                                                 n[hit], cv[hit], score)],
+        "id.orig_h": srcs,
+        "id.resp_h": dsts,
+    }).sort_values("ts", ignore_index=True)
+
+
+def detect_port_scans(conn_df, window=SCAN_WINDOW,
+                      port_threshold=SCAN_PORT_THRESHOLD,
+                      host_threshold=SCAN_HOST_THRESHOLD):
+    """
+    Flag vertical (many ports) and horizontal (many hosts) scans.
+    Counts distinct destination ports and hosts per source within fixed
+    time buckets, all in batch over sorted integer keys.
+    """
+    return scan_alerts(conn_arrays(conn_df), window, port_threshold, host_threshold)
+
+
+def detect_beacons(conn_df, min_events=BEACON_MIN_EVENTS,
+                   max_cv=BEACON_MAX_CV, min_interval=BEACON_MIN_INTERVAL):
+    """
+    Score periodic C2 beacons per (src, dst, port) from inter-arrival times.
+    A low coefficient of variation (std / mean) of the gaps between
+    connections means a regular, machine-driven check-in.
+    """
+    return beacon_alerts(conn_arrays(conn_df), min_events, max_cv, min_interval)
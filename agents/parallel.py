@@ -0,0 +1,466 @@
+"""
+Sharded, multi-process execution of the analyzer rule sets
+(agents.analyzer and agents.analyzer2).
+
+The parent copies the columns the rules read, as-is, into one Arrow IPC
+file in shared memory and hands out plain row ranges of it. Each worker
+maps the file zero-copy, evaluates the row-local rules over its range
+and formats those alert rows itself, so the parent does no per-row work
+beyond that one copy and concatenating results.
+
+Port scans and beacons need all of a source host's conn rows together.
+The row-range workers also hash-partition their conn rows by source host
+into a shared buffer, and a second set of tasks runs the
+agents.detections core over one hash bucket each. The only other
+cross-shard state is the rogue-DHCP server counts, and analyzer2's
+dataset-wide resp_bytes q99, which the parent computes up front. Results
+match the serial generate_alerts of each module.
+
+Workers come from one long-lived pool per process, started with the
+forkserver method (spawn where forkserver is unavailable). Forking the
+threaded server, with its encoder loaded, is unsafe, and the forkserver
+only preloads this module. Each worker still imports the launching
+script once, as __mp_main__, so keep it light at import time and put
+start-up work behind `if __name__ == "__main__"`.
+"""
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from multiprocessing import shared_memory
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from agents.detections import (SCAN_WINDOW, SCAN_PORT_THRESHOLD, SCAN_HOST_THRESHOLD,
+                               BEACON_MIN_EVENTS, BEACON_MAX_CV, BEACON_MIN_INTERVAL,
+                               beacon_alerts, conn_arrays, scan_alerts)
+from metrics import stage, peak_rss
+
+MIN_SHARD_ROWS = 50_000
+RULE_SETS = ("analyzer", "analyzer2")
+
+COLUMNS = {
+    "analyzer": ["ts", "_path", "id.orig_h", "id.resp_h", "id.resp_p", "conn_state",
+                 "orig_bytes", "resp_bytes", "auth_attempts", "msg_type", "query", "uri"],
+    "analyzer2": ["ts", "_path", "id.orig_h", "orig_h", "id.resp_h", "resp_h", "proto",
+                  "conn_state", "orig_bytes", "resp_bytes"],
+}
+HOST_COLUMNS = ["ts", "id.orig_h", "id.resp_h", "id.resp_p"]
+
+_SHARED = {}
+_POOL = None
+_POOL_WORKERS = 0
+_POOL_LOCK = Lock()
+
+
+# ----------------------------------------------------------
+# Worker pool
+# ----------------------------------------------------------
+def _mp_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["agents.parallel"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def get_pool(workers):
+    """
+    The process-wide worker pool, created on first use (or when the
+    requested size changes) and reused across requests.
+    """
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS != workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=True)
+            _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context())
+            _POOL_WORKERS = workers
+        return _POOL
+
+
+def shutdown_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=True)
+            _POOL = None
+
+
+atexit.register(shutdown_pool)
+
+
+# ----------------------------------------------------------
+# Shared buffers
+# ----------------------------------------------------------
+def _arrow(df, cols):
+    """
+    The columns as an Arrow table, zero-copy where pandas already holds
+    Arrow or NumPy data. A mixed-type object column is shipped as the
+    str() of each value, which is how the rules format it.
+    """
+    arrays = {}
+    for col in cols:
+        try:
+            arrays[col] = pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays[col] = pa.array(df[col].to_numpy(dtype=object).astype(str))
+    return pa.table(arrays)
+
+
+def _share_table(table):
+    """
+    Write `table` as an Arrow IPC file into a new shared-memory block.
+    """
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    shm = shared_memory.SharedMemory(create=True, size=max(sink.size(), 1))
+    out = pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf))
+    with pa.ipc.new_file(out, table.schema) as writer:
+        writer.write_table(table)
+    out.close()
+    return shm
+
+
+def _attach(spec):
+    """
+    Map this run's table (and conn partition buffer) once per worker.
+    The previous run's mapping is dropped first; its results are sent.
+    """
+    if _SHARED.get("run") != spec["table"]:
+        blocks = _SHARED.pop("blocks", [])
+        _SHARED.clear()
+        for shm in blocks:
+            shm.close()
+        # Pool workers share the parent's resource tracker; the parent unlinks
+        shm = shared_memory.SharedMemory(name=spec["table"])
+        _SHARED.update(run=spec["table"], blocks=[shm],
+                       table=pa.ipc.open_file(pa.py_buffer(shm.buf)).read_all())
+        if spec.get("conn_rows"):
+            rows = shared_memory.SharedMemory(name=spec["conn_rows"])
+            _SHARED["blocks"].append(rows)
+            _SHARED["conn_rows"] = np.ndarray((spec["rows"],), dtype=np.int64, buffer=rows.buf)
+    return _SHARED
+
+
+# ----------------------------------------------------------
+# Shard workers
+# ----------------------------------------------------------
+def _run_shard(task):
+    kind, spec, args, params = task
+    shared = _attach(spec)
+    if kind == "hosts":
+        out = _shard_hosts(shared, args, params)
+    elif kind == "analyzer2":
+        out = _shard_rules_v2(shared["table"], *args, params)
+    else:
+        out = _shard_rules(shared, *args, params)
+    out["peak_rss"] = peak_rss()
+    return out
+
+
+def _s(rows, col, default="None"):
+    """
+    str() of each value, as the serial rules' f-strings print it.
+    """
+    if col not in rows:
+        return pd.Series(default, index=rows.index, dtype=object)
+    return pd.Series(rows[col].to_numpy(dtype=object).astype(str), index=rows.index, dtype=object)
+
+
+def _num(rows, col, default=np.nan):
+    if col not in rows:
+        return np.full(len(rows), default)
+    return pd.to_numeric(rows[col], errors="coerce").to_numpy(dtype=np.float64)
+
+
+def _alerts(rows, kind, desc):
+    return pd.DataFrame({"ts": rows["ts"] if "ts" in rows else pd.NaT, "type": kind, "desc": desc})
+
+
+def _shard_rules(shared, lo, hi, params):
+    """
+    analyzer's row-local rules over rows [lo, hi), plus this range's
+    conn rows partitioned by source-host hash for the host tasks.
+    """
+    df = shared["table"].slice(lo, hi - lo).to_pandas()
+    is_path = {p: (df["_path"] == p).to_numpy() for p in ("conn", "ssh", "dhcp", "dns", "http")}
+    out = {}
+
+    def rows_of(path, *cols):
+        # Only this log type's rows, and only the columns its rule reads
+        return df.loc[is_path[path], [c for c in ("ts", "id.orig_h", "id.resp_h") + cols if c in df]]
+
+    if "conn_state" in df:
+        conn = rows_of("conn", "conn_state")
+        rows = conn[conn["conn_state"].isin(["S0", "REJ", "RSTO"])]
+        out["failed"] = _alerts(rows, "Failed Connection", "Connection " + _s(rows, "id.orig_h")
+                                + " | " + _s(rows, "id.resp_h") + " failed ("
+                                + _s(rows, "conn_state") + ")")
+    if "orig_bytes" in df and "resp_bytes" in df:
+        conn = rows_of("conn", "orig_bytes", "resp_bytes")
+        rows = conn[(_num(conn, "resp_bytes") > 5e6) | (_num(conn, "orig_bytes") > 5e6)]
+        out["high_transfer"] = _alerts(rows, "High Data Transfer", "High transfer "
+                                       + _s(rows, "id.orig_h") + " | " + _s(rows, "id.resp_h")
+                                       + " (" + _s(rows, "resp_bytes") + " bytes)")
+
+    if "conn_rows" in shared:
+        # Stable-sort this range's conn rows by bucket into its slice of the buffer
+        src = df.loc[is_path["conn"], "id.orig_h"]
+        known = src.notna().to_numpy()
+        pos = lo + np.flatnonzero(is_path["conn"])[known]
+        bucket = pd.util.hash_pandas_object(src[known], index=False).to_numpy() % params["buckets"]
+        order = np.argsort(bucket, kind="stable")
+        shared["conn_rows"][lo:lo + len(pos)] = pos[order]
+        out["conn_buckets"] = lo + np.searchsorted(bucket[order], np.arange(params["buckets"] + 1))
+
+    if "auth_attempts" in df:
+        ssh = rows_of("ssh", "auth_attempts")
+        rows = ssh[_num(ssh, "auth_attempts") > 5]
+        out["ssh"] = _alerts(rows, "SSH Brute Force", "Multiple SSH auth attempts from "
+                             + _s(rows, "id.orig_h") + " to " + _s(rows, "id.resp_h"))
+
+    if "msg_type" in df and "id.resp_h" in df:
+        dhcp = rows_of("dhcp", "msg_type")
+        offers = dhcp["msg_type"].str.contains("Offer", case=False, na=False)
+        out["dhcp"] = dhcp.loc[offers, "id.resp_h"].value_counts(sort=False)
+
+    if "query" in df:
+        dns = rows_of("dns", "query")
+        rows = dns[dns["query"].str.contains("base64|.onion|tor", case=False, na=False)]
+        out["dns"] = _alerts(rows, "Suspicious DNS Query", "Suspicious query " + _s(rows, "query")
+                             + " from " + _s(rows, "id.orig_h"))
+
+    if "uri" in df:
+        http = rows_of("http", "uri")
+        rows = http[http["uri"].str.contains("cmd.exe|powershell", case=False, na=False)]
+        out["http"] = _alerts(rows, "Suspicious HTTP Request", "Possible C2 via " + _s(rows, "uri")
+                              + " from " + _s(rows, "id.orig_h"))
+    return out
+
+
+def _shard_hosts(shared, ranges, params):
+    """
+    Scans and beacons for one source-host hash bucket. `ranges` are its
+    slices of the conn partition buffer, which together hold every conn
+    row of those sources in row order.
+    """
+    parts = [shared["conn_rows"][a:b] for a, b in ranges]
+    rows = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+    if not len(rows):
+        return {}
+    conn = shared["table"].select(HOST_COLUMNS).take(rows).to_pandas()
+    c = conn_arrays(conn)
+    scans = scan_alerts(c, params["window"], params["port_threshold"], params["host_threshold"])
+    beacons = beacon_alerts(c, params["min_events"], params["max_cv"], params["min_interval"])
+
+    # Global first conn row of each source orders hits across buckets as serial does
+    src = conn["id.orig_h"]
+    first = (~src.duplicated() & src.notna()).to_numpy()
+    src_row = pd.Series(rows[first], index=src[first].to_numpy())
+    return {"scans": scans.assign(_src_row=scans["id.orig_h"].map(src_row)),
+            "beacons": beacons.assign(_src_row=beacons["id.orig_h"].map(src_row))}
+
+
+def _host_v2(rows, col, alt):
+    # r.get(col, r.get(alt, "unknown")) in analyzer2
+    if col in rows:
+        return _s(rows, col)
+    return _s(rows, alt, "unknown")
+
+
+def _shard_rules_v2(table, lo, hi, params):
+    """
+    analyzer2's if/elif chain over rows [lo, hi): the first matching rule
+    wins per row. Alerts come back in row order.
+    """
+    df = table.slice(lo, hi - lo).to_pandas()
+    path = df["_path"]
+    state = df["conn_state"] if "conn_state" in df else pd.Series(None, index=df.index, dtype=object)
+    q99 = params["q99"]
+    recon = ((path == "ssh") & state.isin(["OTH", "S0"])).to_numpy()
+    failed = ~recon & ((path == "conn") & (state == "S0")).to_numpy()
+    high = ~recon & ~failed & ((_num(df, "resp_bytes", 0.0) > q99) | (_num(df, "orig_bytes", 0.0) > q99))
+    dhcp = ~recon & ~failed & ~high & (path == "dhcp").to_numpy()
+
+    hit = recon | failed | high | dhcp
+    rows = df[hit]
+    recon, failed, high = recon[hit], failed[hit], high[hit]
+    src, dst = _host_v2(rows, "id.orig_h", "orig_h"), _host_v2(rows, "id.resp_h", "resp_h")
+    kind = np.select([recon, failed, high], ["SSH Recon", "Failed Conn", "High Data Transfer"],
+                     default="DHCP Activity")
+    desc = np.array("DHCP message " + src + "->" + dst, dtype=object)
+    desc[recon] = ("SSH partial handshake from " + src + " to " + dst)[recon]
+    desc[failed] = ("No reply " + _s(rows, "proto", "unknown") + " " + src + "->" + dst)[failed]
+    desc[high] = ("High volume " + src + "->" + dst)[high]
+    return {"alerts": pd.DataFrame({"ts": rows["ts"], "type": kind, "desc": desc})}
+
+
+# ----------------------------------------------------------
+# Planning and merging
+# ----------------------------------------------------------
+def _target_rows(n, workers):
+    return max(MIN_SHARD_ROWS, -(-n // (workers * 4)))
+
+
+def _run(workers, tasks):
+    try:
+        return list(get_pool(workers).map(_run_shard, tasks))
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool on the next call
+        shutdown_pool()
+        raise
+
+
+def analyze_sharded(df, workers=None, rules="analyzer"):
+    """
+    Run one rule set ("analyzer" or "analyzer2") over row-range shards in
+    the worker pool. Returns (alerts DataFrame, merged stats), with alerts
+    identical to that module's generate_alerts.
+    """
+    if rules not in RULE_SETS:
+        raise ValueError(f"Unknown rule set: {rules}")
+    workers = workers or os.cpu_count() or 1
+    if df.empty or "_path" not in df:
+        cols = ["ts", "type", "desc"] + (["id.orig_h", "id.resp_h"] if rules == "analyzer" else [])
+        return pd.DataFrame(columns=cols), {"rows": len(df)}
+
+    if rules == "analyzer2":
+        _normalize_ts_v2(df)
+    elif "ts" in df.columns:
+        df["ts"] = pd.to_datetime(df["ts"], errors="coerce")
+
+    n = len(df)
+    target = _target_rows(n, workers)
+    shards = [(lo, min(lo + target, n)) for lo in range(0, n, target)]
+    blocks = []
+    with stage("parallel.prepare", rows_in=n) as prepare:
+        blocks.append(_share_table(_arrow(df, [c for c in COLUMNS[rules] if c in df])))
+        spec = {"table": blocks[0].name, "rows": n}
+        if rules == "analyzer2":
+            # The dataset-wide threshold analyzer2 compares every row against
+            column = "resp_bytes" if "resp_bytes" in df else "orig_bytes"
+            q99 = df[column].quantile(0.99) if column in df else 0
+            params = {"q99": q99}
+        else:
+            params = {"buckets": len(shards), "window": SCAN_WINDOW,
+                      "port_threshold": SCAN_PORT_THRESHOLD, "host_threshold": SCAN_HOST_THRESHOLD,
+                      "min_events": BEACON_MIN_EVENTS, "max_cv": BEACON_MAX_CV,
+                      "min_interval": BEACON_MIN_INTERVAL}
+            if all(c in df for c in HOST_COLUMNS):
+                blocks.append(shared_memory.SharedMemory(create=True, size=max(n * 8, 1)))
+                spec["conn_rows"] = blocks[1].name
+
+    try:
+        with stage("parallel.rows", rows_in=n) as by_rows:
+            results = _run(workers, [(rules, spec, shard, params) for shard in shards])
+            by_rows.rows_out = len(results)
+        # Bucket b is the b-th slice of every range's part of the partition buffer
+        cuts = [r["conn_buckets"] for r in results if "conn_buckets" in r]
+        tasks = [("hosts", spec, [(c[b], c[b + 1]) for c in cuts if c[b + 1] > c[b]], params)
+                 for b in range(params.get("buckets", 0))]
+        tasks = [t for t in tasks if t[2]]
+        with stage("parallel.hosts", rows_in=int(sum(c[-1] - c[0] for c in cuts))) as by_hosts:
+            hosts = _run(workers, tasks) if tasks else []
+            by_hosts.rows_out = len(hosts)
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    with stage("parallel.merge", rows_in=len(results) + len(hosts)) as merge:
+        if rules == "analyzer":
+            alerts, stats = _merge(results, hosts)
+        else:
+            alerts, stats = _merge_v2(results)
+            stats[f"{column}_q99"] = float(q99)
+        stats.update({
+            "rows": n,
+            "shards": len(shards),
+            "host_buckets": len(hosts),
+            # Largest worker RSS high-water mark; the parent's is not included
+            "worker_peak_rss_mb": round(max(r["peak_rss"] for r in results + hosts) / 2**20, 1),
+        })
+        merge.rows_out = len(alerts)
+    stats["seconds"] = {"prepare": round(prepare.seconds, 4), "rows": round(by_rows.seconds, 4),
+                        "hosts": round(by_hosts.seconds, 4), "merge": round(merge.seconds, 4)}
+    return alerts, stats
+
+
+def _normalize_ts_v2(df):
+    """
+    analyzer2's timestamp fallback, applied to `df` in place the same way.
+    """
+    if "ts" not in df.columns:
+        for alt in ["_write_ts", "_time", "start_time", "end_time"]:
+            if alt in df.columns:
+                df["ts"] = pd.to_datetime(df[alt], errors="coerce")
+                break
+        else:
+            df["ts"] = pd.date_range("1970-01-01", periods=len(df), freq="s")
+
+
+def _concat(frames):
+    frames = [f for f in frames if len(f)]
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+def _merge(results, hosts):
+    """
+    Shard results in analyzer's rule order; each rule's rows stay in
+    row order because shards are consecutive row ranges.
+    """
+    by = lambda key, parts=results: [r[key] for r in parts if key in r]
+    frames = [_concat(by("failed")), _concat(by("high_transfer"))]
+
+    scans = _concat(by("scans", hosts))
+    if scans is not None:
+        scans["_rank"] = scans["type"] != "Vertical Port Scan"
+        frames.append(scans.sort_values(["_rank", "_src_row"], kind="stable")
+                      .drop(columns=["_rank", "_src_row"]))
+    beacons = _concat(by("beacons", hosts))
+    if beacons is not None:
+        frames.append(beacons.sort_values(["ts", "_src_row"], kind="stable").drop(columns="_src_row"))
+
+    frames.append(_concat(by("ssh")))
+
+    # Rogue DHCP: merge offer counts per server across shards
+    servers = {}
+    dhcp = [d for d in by("dhcp") if len(d)]
+    if dhcp:
+        totals = pd.concat(dhcp).groupby(level=0, sort=False).sum()
+        totals = totals.sort_values(ascending=False, kind="stable")
+        servers = {str(k): int(v) for k, v in totals.items()}
+        if len(servers) > 1:
+            frames.append(pd.DataFrame([{
+                "ts": datetime.utcnow(), "type": "Rogue DHCP Server",
+                "desc": f"Multiple DHCP servers detected: {', '.join(servers)}"}]))
+
+    frames += [_concat(by("dns")), _concat(by("http"))]
+    frames = [f for f in frames if f is not None]
+    alerts = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["ts", "type", "desc"])
+    return alerts, {"dhcp_offer_servers": servers}
+
+
+def _merge_v2(results):
+    """
+    analyzer2 alerts in row order, then sorted by ts as it does.
+    """
+    alerts = _concat(r["alerts"] for r in results)
+    if alerts is None:
+        return pd.DataFrame(columns=["ts", "type", "desc"]), {}
+    return alerts.sort_values("ts", ignore_index=True), {}
+
+
+def generate_alerts(df, workers=None, rules="analyzer"):
+    """
+    Drop-in parallel counterpart of analyzer.generate_alerts
+    (or analyzer2.generate_alerts with rules="analyzer2").
+    """
+    return analyze_sharded(df, workers, rules)[0]
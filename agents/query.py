@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+INDEXED_FIELDS = ["id.orig_h", "id.resp_h", "_path", "id.orig_p", "id.resp_p", "proto"]
+
+
+def _key(value):
+    """
+    Normalize a lookup key so 443, 443.0 and "443" hit the same posting list.
+    """
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    return str(value).strip()
+
+
+def _to_ns(ts):
+    """
+    UTC nanoseconds since the epoch for a timestamp column or scalar.
+    """
+    if isinstance(ts, pd.Series):
+        ts = pd.to_datetime(ts, errors="coerce", utc=True)
+        return ts.dt.as_unit("ns").to_numpy(dtype="datetime64[ns]").view("int64")
+    ts = pd.Timestamp(ts)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.as_unit("ns").value
+
+
+def _intersect_sorted(small, large):
+    """
+    Elements of sorted `small` present in sorted `large`, by binary search
+    (O(len(small) * log(len(large))) rather than a merge over both).
+    """
+    if not len(small) or not len(large):
+        return small[:0]
+    idx = np.minimum(np.searchsorted(large, small), len(large) - 1)
+    return small[large[idx] == small]
+
+
+def _union(parts, dtype):
+    if not parts:
+        return np.empty(0, dtype=dtype)
+    if len(parts) == 1:
+        return parts[0]
+    return np.unique(np.concatenate(parts))
+
+
+class LogIndex:
+    """
+    Read-only indexes over one loaded dataset for fast pivot queries.
+
+    Positions are ranks in timestamp order, so a time range is a contiguous
+    slice found by binary search. Each indexed field keeps a CSR-style
+    posting list (positions per distinct value, ascending), which means a
+    posting list can itself be narrowed to a time range by binary search
+    and compound filters are sorted-array intersections. The DataFrame is
+    referenced, not copied.
+    """
+    def __init__(self, df, fields=INDEXED_FIELDS):
+        ts = _to_ns(df["ts"]) if "ts" in df else np.zeros(len(df), dtype=np.int64)
+        self.df = df
+        self.pos_dtype = np.int32 if len(df) < 2**31 else np.int64
+        self.order = np.argsort(ts, kind="stable").astype(self.pos_dtype)
+        self.ts = ts[self.order]
+        self.postings = {}
+        for field in fields:
+            if field in df:
+                self.postings[field] = self._build(df[field].to_numpy()[self.order])
+
+    def _build(self, column):
+        codes, uniques = pd.factorize(column, use_na_sentinel=True)
+        # Raw values that normalize to the same key (443 and "443") share a list
+        keys, key_names = pd.factorize(pd.Index([_key(v) for v in uniques], dtype=object))
+        if len(uniques):
+            codes = np.where(codes >= 0, keys[codes], -1)
+        order = np.argsort(codes, kind="stable").astype(self.pos_dtype)
+        counts = np.bincount(codes[codes >= 0], minlength=len(key_names))
+        start = int((codes < 0).sum())
+        offsets = start + np.concatenate(([0], np.cumsum(counts)))
+        lookup = {k: i for i, k in enumerate(key_names)}
+        return lookup, offsets, order
+
+    def __len__(self):
+        return len(self.df)
+
+    def time_range(self, start=None, end=None):
+        """
+        [lo, hi) row positions with start <= ts < end.
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.ts, _to_ns(start), side="left"))
+        hi = len(self.ts) if end is None else int(np.searchsorted(self.ts, _to_ns(end), side="left"))
+        return lo, max(lo, hi)
+
+    def _parts(self, field, values, lo, hi):
+        """
+        Per-value posting lists for `field`, each narrowed to [lo, hi).
+        """
+        lookup, offsets, order = self.postings[field]
+        parts = []
+        for v in set(map(_key, values)):
+            code = lookup.get(v)
+            if code is None:
+                continue
+            plist = order[offsets[code]:offsets[code + 1]]
+            parts.append(plist[np.searchsorted(plist, lo):np.searchsorted(plist, hi)])
+        return parts
+
+    def postings_for(self, field, values, lo=0, hi=None):
+        """
+        Sorted row positions where `field` is any of `values`, within [lo, hi).
+        """
+        hi = len(self.ts) if hi is None else hi
+        return _union(self._parts(field, values, lo, hi), self.pos_dtype)
+
+    def query(self, start=None, end=None, host=None, limit=None, **filters):
+        """
+        Rows matching every filter (AND across fields, OR within one).
+        `host` matches either id.orig_h or id.resp_h; other keyword filters
+        name an indexed field with '.' written as '_' (e.g. id_resp_p=443).
+        Returns (total matches, DataFrame of the first `limit` rows).
+        """
+        lo, hi = self.time_range(start, end)
+        groups = []
+        if host:
+            groups.append([p for f in ("id.orig_h", "id.resp_h") if f in self.postings
+                           for p in self._parts(f, host, lo, hi)])
+        for name, values in filters.items():
+            if not values:
+                continue
+            field = "id." + name[3:] if name.startswith("id_") else name
+            if field not in self.postings:
+                raise KeyError(f"Field is not indexed: {field}")
+            groups.append(self._parts(field, values, lo, hi))
+
+        if groups:
+            # Seed with the most selective filter; probe the others by binary search
+            groups.sort(key=lambda parts: sum(map(len, parts)))
+            hits = _union(groups[0], self.pos_dtype)
+            for parts in groups[1:]:
+                if not len(hits):
+                    break
+                hits = _union([_intersect_sorted(hits, p) for p in parts], self.pos_dtype)
+        else:
+            hits = np.arange(lo, hi)
+
+        shown = hits if limit is None else hits[:limit]
+        return len(hits), self.df.iloc[self.order[shown]]
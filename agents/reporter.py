@@ -1,12 +1,25 @@
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
 from utils import ollama_complete
 
-def query_tactic(tactic, mapped_timeline, retriever, model):
-    ctx="\n".join(retriever(tactic))
-    timeline_text="\n".join([f"{m['summary']}\n{m['mapping']}" for m in mapped_timeline])
-    prompt=f"""
+REPORTER_TOP_K = 8
+REPORTER_TOKEN_BUDGET = 3000
+CHARS_PER_TOKEN = 4  # rough average for English/log text
+
+# Segment embeddings and answers, keyed by a fingerprint of the timeline
+# content; both are LRU-bounded so repeated /collector runs don't grow them
+MAX_SEGMENT_INDEXES = 8
+MAX_CACHED_ANSWERS = 256
+_segment_indexes = OrderedDict()
+_answers = OrderedDict()
+_cache_lock = Lock()
+
+PROMPT = """
 Tactic: {tactic}
 Timeline:
-{timeline_text}
+{timeline}
 
 Explain where this tactic appears in the attack, 
 how it fits into an adversary playbook, 
@@ -14,4 +27,118 @@ and list 3 SOC actions to take.
 Context:
 {ctx}
 """
-    return ollama_complete(prompt, model=model)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _clip(text, tokens):
+    limit = max(0, tokens) * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit] + " ...[truncated]"
+
+
+def _segment_text(segment):
+    if isinstance(segment, dict):
+        return f"{segment.get('summary', '')}\n{segment.get('mapping', '')}".strip()
+    return str(segment)
+
+
+def timeline_fingerprint(mapped_timeline):
+    """
+    Content hash of a mapped timeline; any edited, added or removed
+    segment changes it.
+    """
+    h = hashlib.sha1()
+    for segment in mapped_timeline or []:
+        h.update(_segment_text(segment).encode("utf-8", "replace"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _lru_get(cache, key):
+    with _cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _lru_put(cache, key, value, max_size):
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+
+def segment_index(incident_id, mapped_timeline, encoder, fingerprint=None):
+    """
+    Embed an incident's mapped segments once per distinct timeline content.
+    """
+    key = (incident_id, fingerprint or timeline_fingerprint(mapped_timeline))
+    index = _lru_get(_segment_indexes, key)
+    if index is None:
+        # faiss is only needed once segments are actually embedded
+        from embeddings import EmbeddingIndex
+        index = EmbeddingIndex(encoder=encoder)
+        index.add_docs([{"id": i, "text": _segment_text(m)} for i, m in enumerate(mapped_timeline)])
+        _lru_put(_segment_indexes, key, index, MAX_SEGMENT_INDEXES)
+    return index
+
+
+def select_segments(tactic, mapped_timeline, budget, index=None, top_k=REPORTER_TOP_K):
+    """
+    Most relevant segments for `tactic` that fit in `budget` tokens,
+    returned in timeline order. Without an index, falls back to the
+    earliest segments.
+    """
+    if index is not None:
+        ranked = [doc["id"] for doc, _ in index.search(tactic, k=top_k)]
+    else:
+        ranked = range(min(top_k, len(mapped_timeline)))
+
+    chosen, used = [], 0
+    for i in ranked:
+        text = _segment_text(mapped_timeline[i])
+        cost = estimate_tokens(text)
+        if used + cost > budget:
+            if chosen:
+                continue
+            text, cost = _clip(text, budget), budget
+        chosen.append((i, text))
+        used += cost
+    return [text for _, text in sorted(chosen)]
+
+
+def query_tactic(tactic, mapped_timeline, retriever, model, incident_id=None, encoder=None,
+                 top_k=REPORTER_TOP_K, token_budget=REPORTER_TOKEN_BUDGET):
+    """
+    Ask the LLM about one tactic using only the top-k timeline segments
+    relevant to it, keeping the whole prompt under `token_budget`.
+    Answers are cached per incident, timeline content, tactic, model and
+    prompt limits, so a changed timeline is always re-queried.
+    """
+    fingerprint = timeline_fingerprint(mapped_timeline)
+    cache_key = (incident_id, fingerprint, tactic, model, top_k, token_budget)
+    if incident_id is not None:
+        answer = _lru_get(_answers, cache_key)
+        if answer is not None:
+            return answer
+
+    index = None
+    if encoder is not None and incident_id is not None and mapped_timeline:
+        index = segment_index(incident_id, mapped_timeline, encoder, fingerprint)
+
+    # Reference context gets at most a third of what the template leaves
+    budget = token_budget - estimate_tokens(PROMPT.format(tactic=tactic, timeline="", ctx=""))
+    ctx = _clip("\n".join(retriever(tactic)), budget // 3)
+    budget -= estimate_tokens(ctx)
+
+    timeline_text = "\n".join(select_segments(tactic, mapped_timeline, budget, index, top_k))
+    prompt = PROMPT.format(tactic=tactic, timeline=timeline_text, ctx=ctx)
+    answer = ollama_complete(prompt, model=model)
+
+    if incident_id is not None:
+        _lru_put(_answers, cache_key, answer, MAX_CACHED_ANSWERS)
+    return answer
@@ -0,0 +1,297 @@
+"""
+Out-of-core execution backend: the analyzer rules, alert aggregation and
+summarizer statistics as DuckDB SQL over NDJSON/Parquet files on disk.
+
+DuckDB scans the files with parallel vectorized readers and spills to
+`temp_directory` when an aggregation exceeds `memory_limit`, so datasets
+larger than RAM can be analyzed. Alerts come back in the same
+ts/type/desc DataFrame schema as agents.analyzer.generate_alerts; the
+agents.analyzer2 rule set is available with rules="analyzer2".
+Timestamps are parsed and returned as tz-aware UTC, as the pandas path
+gives for Corelight "...Z" strings; ISO strings without an offset are
+read as UTC.
+"""
+import glob
+import os
+
+import duckdb
+import pandas as pd
+
+from agents.detections import (SCAN_WINDOW, SCAN_PORT_THRESHOLD, SCAN_HOST_THRESHOLD,
+                               BEACON_MIN_EVENTS, BEACON_MAX_CV, BEACON_MIN_INTERVAL)
+from agents.utils import COLUMNS_BY_PATH
+from metrics import stage
+
+# Normalized view columns and their SQL types
+FIELDS = {
+    "_path": "VARCHAR", "uid": "VARCHAR",
+    "id.orig_h": "VARCHAR", "id.orig_p": "BIGINT",
+    "id.resp_h": "VARCHAR", "id.resp_p": "BIGINT",
+    "proto": "VARCHAR", "service": "VARCHAR", "conn_state": "VARCHAR",
+    "orig_bytes": "BIGINT", "resp_bytes": "BIGINT",
+    "user": "VARCHAR", "auth_attempts": "BIGINT", "success": "VARCHAR", "password": "VARCHAR",
+    "mac": "VARCHAR", "assigned_addr": "VARCHAR", "msg_type": "VARCHAR",
+    "hostname": "VARCHAR", "vendor_class": "VARCHAR",
+    "query": "VARCHAR", "qtype_name": "VARCHAR", "answers": "VARCHAR", "rcode_name": "VARCHAR",
+    "method": "VARCHAR", "host": "VARCHAR", "uri": "VARCHAR", "status_code": "BIGINT",
+    "user_agent": "VARCHAR",
+}
+TS_FIELDS = ["ts", "_write_ts", "_time", "start_time"]
+
+ALERT_COLUMNS = ["ts", "type", "desc", "id.orig_h", "id.resp_h"]
+
+_PARQUET_CACHES = {}
+
+
+def _q(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _lit(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _expand(paths):
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for p in paths:
+        files.extend(sorted(glob.glob(p)) or [p])
+    return files
+
+
+def _reader(files):
+    listing = "[" + ", ".join(_lit(f) for f in files) + "]"
+    if all(f.endswith(".parquet") for f in files):
+        return f"read_parquet({listing}, union_by_name=true)"
+    return (f"read_json_auto({listing}, format='newline_delimited', union_by_name=true, "
+            "ignore_errors=true, maximum_object_size=104857600)")
+
+
+def _ts_expr(raw):
+    """
+    First parseable timestamp among TS_FIELDS as TIMESTAMPTZ; handles epoch
+    seconds and ISO strings (with or without an offset).
+    """
+    parts = []
+    for v in raw:
+        parts.append(f"CASE WHEN TRY_CAST({v} AS DOUBLE) IS NOT NULL "
+                     f"THEN to_timestamp(TRY_CAST({v} AS DOUBLE)) "
+                     f"ELSE TRY_CAST({v} AS TIMESTAMPTZ) END")
+    return "COALESCE(" + ", ".join(parts) + ")" if parts else "NULL::TIMESTAMPTZ"
+
+
+def connect(paths, memory_limit=None, threads=None, temp_directory="store/duckdb_tmp",
+            cache_parquet=True):
+    """
+    Open an in-process DuckDB connection with a `logs` view over `paths`
+    (files or glob patterns). Corelight `_raw` JSON payloads are parsed
+    once per row and merged with any top-level columns. With
+    `cache_parquet`, NDJSON input is normalized into a Parquet file under
+    `temp_directory` in one streaming pass, so each rule afterwards runs
+    a columnar scan instead of re-parsing JSON.
+    """
+    os.makedirs(temp_directory, exist_ok=True)
+    con = duckdb.connect()
+    # TIMESTAMPTZ values (and naive ISO strings) are read and returned in UTC
+    con.execute("SET TimeZone='UTC'")
+    con.execute(f"SET temp_directory={_lit(temp_directory)}")
+    if memory_limit:
+        con.execute(f"SET memory_limit={_lit(memory_limit)}")
+    if threads:
+        con.execute(f"SET threads={int(threads)}")
+
+    files = _expand(paths)
+    con.execute(f"CREATE VIEW src AS SELECT * FROM {_reader(files)}")
+    cols = {r[0] for r in con.execute("DESCRIBE src").fetchall()}
+    has_raw = "_raw" in cols
+
+    names = TS_FIELDS + list(FIELDS)
+    if has_raw:
+        json_paths = "[" + ", ".join(_lit(f'$."{n}"') for n in names) + "]"
+        source = f"(SELECT *, json_extract_string(_raw, {json_paths}) AS __v FROM src)"
+    else:
+        source = "src"
+
+    def raw_values(i, name):
+        values = [f"__v[{i + 1}]"] if has_raw else []
+        if name in cols:
+            values.append(f"CAST({_q(name)} AS VARCHAR)")
+        return values
+
+    ts_raw = [v for i, n in enumerate(TS_FIELDS) for v in raw_values(i, n)]
+    select = [f"{_ts_expr(ts_raw)} AS ts"]
+    for i, (name, kind) in enumerate(FIELDS.items(), start=len(TS_FIELDS)):
+        values = raw_values(i, name)
+        expr = f"COALESCE({', '.join(values)})" if values else "NULL"
+        select.append(f"TRY_CAST({expr} AS {kind}) AS {_q(name)}")
+
+    con.execute(f"CREATE VIEW logs AS SELECT {', '.join(select)} FROM {source}")
+
+    if cache_parquet and not all(f.endswith(".parquet") for f in files):
+        with stage("ingest.parquet_cache") as s:
+            cache = os.path.join(temp_directory, f"logs_{os.getpid()}_{id(con)}.parquet")
+            con.execute(f"COPY (SELECT * FROM logs) TO {_lit(cache)} (FORMAT parquet)")
+            s.rows_out = con.fetchone()[0]
+        con.execute(f"CREATE OR REPLACE VIEW logs AS SELECT * FROM read_parquet({_lit(cache)})")
+        _PARQUET_CACHES[id(con)] = cache
+    return con
+
+
+def close(con):
+    """
+    Close a connection from `connect` and delete its Parquet cache.
+    """
+    con.close()
+    cache = _PARQUET_CACHES.pop(id(con), None)
+    if cache and os.path.exists(cache):
+        os.remove(cache)
+
+
+def _rule_queries():
+    """
+    One SELECT per analyzer rule, each producing ALERT_COLUMNS.
+    """
+    width = int(pd.Timedelta(SCAN_WINDOW).total_seconds())
+    return {
+        "failed_connection": """
+            SELECT ts, 'Failed Connection' AS type,
+                   'Connection ' || "id.orig_h" || ' | ' || "id.resp_h" || ' failed (' || conn_state || ')' AS "desc",
+                   "id.orig_h", "id.resp_h"
+            FROM logs WHERE _path = 'conn' AND conn_state IN ('S0', 'REJ', 'RSTO')""",
+        "high_data_transfer": """
+            SELECT ts, 'High Data Transfer',
+                   'High transfer ' || "id.orig_h" || ' | ' || "id.resp_h" || ' (' || COALESCE(resp_bytes::DOUBLE::VARCHAR, 'nan') || ' bytes)',
+                   "id.orig_h", "id.resp_h"
+            FROM logs WHERE _path = 'conn' AND (resp_bytes > 5e6 OR orig_bytes > 5e6)""",
+        "port_scan": f"""
+            WITH b AS (
+                SELECT "id.orig_h" AS src, time_bucket(INTERVAL '{width} seconds', ts) AS bucket,
+                       COUNT(DISTINCT "id.resp_p") AS ports, COUNT(DISTINCT "id.resp_h") AS hosts
+                FROM logs WHERE _path = 'conn' AND ts IS NOT NULL
+                GROUP BY ALL)
+            SELECT bucket, 'Vertical Port Scan',
+                   src || ' contacted ' || ports || ' distinct ports within {SCAN_WINDOW}', src, 'N/A'
+            FROM b WHERE ports >= {SCAN_PORT_THRESHOLD}
+            UNION ALL
+            SELECT bucket, 'Horizontal Scan',
+                   src || ' contacted ' || hosts || ' distinct hosts within {SCAN_WINDOW}', src, 'N/A'
+            FROM b WHERE hosts >= {SCAN_HOST_THRESHOLD}""",
+        "beacon": f"""
+            WITH g AS (
+                SELECT "id.orig_h" AS src, "id.resp_h" AS dst, "id.resp_p" AS port, ts,
+                       epoch(ts) - epoch(lag(ts) OVER (PARTITION BY "id.orig_h", "id.resp_h", "id.resp_p"
+                                                      ORDER BY ts)) AS gap
+                FROM logs WHERE _path = 'conn' AND ts IS NOT NULL),
+            f AS (
+                SELECT src, dst, port, MIN(ts) AS first_ts, COUNT(*) AS n,
+                       AVG(gap) AS mean, STDDEV_POP(gap) / AVG(gap) AS cv
+                FROM g GROUP BY ALL)
+            SELECT first_ts, 'Beaconing',
+                   'Periodic connections ' || src || '->' || dst || ':' || port
+                   || ' every ' || printf('%.1f', mean) || 's (n=' || n || ', cv='
+                   || printf('%.3f', cv) || ', score=' || printf('%.2f', 1 - cv / {BEACON_MAX_CV}) || ')',
+                   src, dst
+            FROM f WHERE n >= {BEACON_MIN_EVENTS} AND mean >= {BEACON_MIN_INTERVAL}
+                     AND cv <= {BEACON_MAX_CV}""",
+        "ssh_brute_force": """
+            SELECT ts, 'SSH Brute Force',
+                   'Multiple SSH auth attempts from ' || "id.orig_h" || ' to ' || "id.resp_h",
+                   "id.orig_h", "id.resp_h"
+            FROM logs WHERE _path = 'ssh' AND auth_attempts > 5""",
+        "rogue_dhcp": """
+            SELECT now() AT TIME ZONE 'UTC', 'Rogue DHCP Server',
+                   'Multiple DHCP servers detected: ' || string_agg(DISTINCT "id.resp_h", ', '),
+                   NULL, NULL
+            FROM logs WHERE _path = 'dhcp' AND msg_type ILIKE '%offer%'
+            HAVING COUNT(DISTINCT "id.resp_h") > 1""",
+        "suspicious_dns": """
+            SELECT ts, 'Suspicious DNS Query',
+                   'Suspicious query ' || query || ' from ' || "id.orig_h",
+                   "id.orig_h", "id.resp_h"
+            FROM logs WHERE _path = 'dns' AND regexp_matches(query, 'base64|.onion|tor', 'i')""",
+        "suspicious_http": """
+            SELECT ts, 'Suspicious HTTP Request',
+                   'Possible C2 via ' || uri || ' from ' || "id.orig_h",
+                   "id.orig_h", "id.resp_h"
+            FROM logs WHERE _path = 'http' AND regexp_matches(uri, 'cmd.exe|powershell', 'i')""",
+    }
+
+
+def _rule_queries_v2():
+    """
+    analyzer2.generate_alerts as one pass: its rules are an if/elif chain
+    (first match wins per row) and High Data Transfer compares against the
+    dataset-wide 99th percentile of resp_bytes.
+    """
+    src, dst = """COALESCE("id.orig_h", 'nan')""", """COALESCE("id.resp_h", 'nan')"""
+    return {
+        "analyzer2": f"""
+            WITH q AS (SELECT quantile_cont(resp_bytes, 0.99) AS q99 FROM logs),
+            r AS (
+                SELECT ts, "id.orig_h", "id.resp_h", proto,
+                       CASE WHEN _path = 'ssh' AND conn_state IN ('OTH', 'S0') THEN 'SSH Recon'
+                            WHEN _path = 'conn' AND conn_state = 'S0' THEN 'Failed Conn'
+                            WHEN resp_bytes > q99 OR orig_bytes > q99 THEN 'High Data Transfer'
+                            WHEN _path = 'dhcp' THEN 'DHCP Activity' END AS type
+                FROM logs, q)
+            SELECT ts, type,
+                   CASE type
+                       WHEN 'SSH Recon' THEN 'SSH partial handshake from ' || {src} || ' to ' || {dst}
+                       WHEN 'Failed Conn' THEN 'No reply ' || COALESCE(proto, 'nan') || ' ' || {src} || '->' || {dst}
+                       WHEN 'High Data Transfer' THEN 'High volume ' || {src} || '->' || {dst}
+                       ELSE 'DHCP message ' || {src} || '->' || {dst} END,
+                   "id.orig_h", "id.resp_h"
+            FROM r WHERE type IS NOT NULL""",
+    }
+
+
+def generate_alerts(paths, con=None, rules="analyzer", **connect_kwargs):
+    """
+    SQL counterpart of analyzer.generate_alerts (or, with
+    rules="analyzer2", analyzer2.generate_alerts) over files on disk.
+    The rules are materialized into an `alerts` table on the connection
+    so `alert_summary` can aggregate without rescanning the logs.
+    """
+    queries = {"analyzer": _rule_queries, "analyzer2": _rule_queries_v2}[rules]()
+    con = con or connect(paths, **connect_kwargs)
+    con.execute("CREATE OR REPLACE TABLE alerts (ts TIMESTAMPTZ, type VARCHAR, \"desc\" VARCHAR, "
+                "\"id.orig_h\" VARCHAR, \"id.resp_h\" VARCHAR)")
+    for name, sql in queries.items():
+        with stage(f"detect.{name}") as s:
+            con.execute(f"INSERT INTO alerts {sql}")
+            s.rows_out = con.fetchone()[0]
+
+    alerts = con.execute("SELECT * FROM alerts ORDER BY ts").df()
+    return alerts[ALERT_COLUMNS]
+
+
+def alert_summary(con):
+    """
+    Alert counts per type from the `alerts` table (as value_counts().to_dict()).
+    """
+    rows = con.execute("SELECT type, COUNT(*) AS n FROM alerts GROUP BY type ORDER BY n DESC").fetchall()
+    return {t: n for t, n in rows}
+
+
+def dataset_stats(con, event_filter="dhcp"):
+    """
+    The statistics block of summarizer.summarize_dataset, computed in SQL.
+    """
+    where = f"lower(_path) = {_lit(event_filter.lower())}"
+    rows, src, dst = con.execute(
+        f'SELECT COUNT(*), COUNT(DISTINCT "id.orig_h"), COUNT(DISTINCT "id.resp_h") '
+        f"FROM logs WHERE {where}").fetchone()
+    return {"rows": rows, "unique_src": src, "unique_dst": dst,
+            "event_types": {event_filter: rows} if rows else {}}
+
+
+def sample_events(con, event_filter="dhcp", limit=300):
+    """
+    Earliest `limit` events of one type with the columns clean_zeek_logs keeps.
+    """
+    cols = [c for c in COLUMNS_BY_PATH.get(event_filter.lower(), []) if c == "ts" or c in FIELDS]
+    select = ", ".join(_q(c) for c in cols) or "*"
+    return con.execute(
+        f"SELECT {select} FROM logs WHERE lower(_path) = {_lit(event_filter.lower())} "
+        f"ORDER BY ts LIMIT {int(limit)}").df()
@@ -5,6 +5,7 @@ from threading import Thread
 import pandas as pd
 from transformers import pipeline
 from agents.utils import clean_zeek_logs
+from utils import generate_pdf_report as render_pdf_report
 import pandas as pd
 from transformers import pipeline
 import pandas as pd
@@ -31,8 +32,24 @@ def summarize_dataset(
         "event_types": df["_path"].value_counts().to_dict() if "_path" in df else {},
     }
 
+    return summarize_sample(df.head(300), stats, event_filter, model_name,
+                            max_chars_per_chunk, max_summary_tokens)
+
+
+def summarize_sample(
+    sample_df,
+    stats,
+    event_filter="dhcp",
+    model_name="sshleifer/distilbart-cnn-12-6",
+    max_chars_per_chunk=1800,
+    max_summary_tokens=256,
+):
+    """
+    Summarize a pre-filtered sample of events; `stats` is passed through.
+    Used directly by backends that compute the statistics themselves.
+    """
     # Prepare text sample
-    sample_text = df.head(300).to_csv(index=False)
+    sample_text = sample_df.to_csv(index=False)
     text = (
         f"Summarize the following Zeek/Corelight {event_filter.upper()} logs for a SOC analyst. "
         "Highlight event frequency, anomalies, and relevant network behavior.\n\n"
@@ -74,20 +91,8 @@ def summarize_dataset(
     return final_summary, stats
 
 def generate_pdf_report(summary_text, stats, output_path="store/soc_summary.pdf"):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, "MCP-SOC Incident Summary Report", ln=True, align="C")
-    pdf.ln(10)
-
-    pdf.set_font("Arial", size=12)
-    pdf.multi_cell(0, 8, "Key Statistics:")
-    for k, v in stats.items():
-        pdf.cell(0, 8, f"• {k}: {v}", ln=True)
-
-    pdf.ln(10)
-    pdf.multi_cell(0, 8, "Summary of Findings:")
-    pdf.set_font("Arial", size=11)
-    pdf.multi_cell(0, 8, summary_text)
-    pdf.output(output_path)
-    return output_path
+    """
+    Summary report; rendered by the shared utils.generate_pdf_report.
+    """
+    return render_pdf_report(summary=None, timeline=None, stats=stats,
+                             output_path=output_path, summary_text=summary_text)
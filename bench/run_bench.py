@@ -0,0 +1,235 @@
+"""
+Benchmark harness for the SOC pipeline stages.
+
+Generates a synthetic dataset (see bench/synth.py), times each stage
+(best of `--repeat` untraced runs) and records peak traced memory in a
+separate run. Results are compared against bench/baselines.json, which is
+machine-specific and not committed: save one on the box you compare on.
+A stage more than `--tolerance` slower or larger than its baseline is
+reported as a regression (exit code 1); a case with no baseline for the
+row count is reported too (exit code 2, or a warning with
+--allow-missing-baseline).
+
+    python -m bench.run_bench --rows 100000
+    python -m bench.run_bench --rows 100000 --save-baseline
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.synth import ATTACKS, generate_frame, write_dataset
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+CASES = ["load_zeek_logs", "collect_logs", "generate_alerts", "generate_alerts_v2",
+         "generate_alerts_parallel", "make_timeline", "make_timeline_v2", "embedding_index", "pdf_report"]
+
+
+def measure(build, rows, repeat=3):
+    """
+    Time `build()()` `repeat` times (best run) with no tracing active, then
+    run it once more under tracemalloc for peak Python-heap memory. Tracing
+    slows allocation-heavy stages several-fold, so the two are never mixed.
+    Memory is the calling process only; cases that use the worker pool
+    report the workers' own peak RSS separately.
+    Returns (result, metrics dict).
+    """
+    best = None
+    for _ in range(repeat):
+        fn = build()
+        gc.collect()
+        t0 = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - t0
+        best = seconds if best is None else min(best, seconds)
+
+    fn = build()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {
+        "rows": rows,
+        "seconds": round(best, 4),
+        "rows_per_sec": round(rows / best, 1) if best else None,
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def run_cases(rows, cases, seed=0, workdir=None, repeat=3):
+    """
+    Execute the selected benchmark cases; returns {case: metrics}.
+    Cases whose dependencies are not installed are reported as skipped.
+    """
+    results = {}
+    workdir = workdir or tempfile.mkdtemp(prefix="mcp_soc_bench_")
+    ndjson = os.path.join(workdir, "synthetic.json")
+    if {"load_zeek_logs", "collect_logs"} & set(cases):
+        write_dataset(workdir, rows, fmt="ndjson", seed=seed, attacks=ATTACKS)
+
+    state, extra = {}, {}
+
+    def dataset():
+        # Only the in-memory cases pay for building the whole dataset
+        if "df" not in state:
+            state["df"] = generate_frame(rows, seed=seed, attacks=ATTACKS)[0]
+        return state["df"]
+
+    def case_load_zeek_logs():
+        from utils import load_zeek_logs
+        return lambda: load_zeek_logs(ndjson)
+
+    def case_collect_logs():
+        from agents.collector import collect_logs
+        return lambda: collect_logs(ndjson)
+
+    def case_generate_alerts():
+        from agents.analyzer import generate_alerts
+        frame = dataset().copy()
+        return lambda: state.setdefault("alerts", generate_alerts(frame))
+
+    def case_generate_alerts_v2():
+        from agents.analyzer2 import generate_alerts
+        frame = dataset().copy()
+        return lambda: state.setdefault("alerts_v2", generate_alerts(frame))
+
+    def case_generate_alerts_parallel():
+        from agents.parallel import analyze_sharded
+        frame = dataset().copy()
+
+        def run():
+            alerts, stats = analyze_sharded(frame)
+            if not tracemalloc.is_tracing():
+                extra["generate_alerts_parallel"] = {"worker_peak_rss_mb": stats["worker_peak_rss_mb"],
+                                                     "phase_seconds": stats["seconds"]}
+            return alerts
+        return run
+
+    def case_make_timeline():
+        from agents.analyzer import generate_alerts, make_timeline
+        alerts = state.get("alerts")
+        alerts = generate_alerts(dataset().copy()) if alerts is None else alerts.copy()
+        return lambda: state.setdefault("timeline", make_timeline(alerts))
+
+    def case_make_timeline_v2():
+        from agents.analyzer2 import generate_alerts, make_timeline
+        alerts = state.get("alerts_v2")
+        alerts = generate_alerts(dataset().copy()) if alerts is None else alerts
+        return lambda: make_timeline(alerts)
+
+    def case_embedding_index():
+        from embeddings import EmbeddingIndex
+        # Load the encoder once; each build gets a fresh, empty index
+        encoder = state.get("encoder")
+        index = EmbeddingIndex(encoder=encoder)
+        state["encoder"] = index.model
+        texts = state.get("timeline") or dataset()["_path"].astype(str).tolist()
+        docs = [{"id": f"d{i}", "text": t} for i, t in enumerate(texts[:1000])]
+
+        def run():
+            index.add_docs(docs)
+            return index.retrieve("port scan from internal host", k=3)
+        return run
+
+    def case_pdf_report():
+        from agents.analyzer import generate_alerts, make_timeline
+        from utils import generate_pdf_report
+        alerts = state.get("alerts")
+        alerts = generate_alerts(dataset().copy()) if alerts is None else alerts
+        timeline = state.get("timeline") or make_timeline(alerts.copy())
+        summary = alerts["type"].value_counts().to_dict()
+        out = os.path.join(workdir, "bench_report.pdf")
+        return lambda: generate_pdf_report(summary, timeline, alerts=alerts, output_path=out)
+
+    scope = locals()
+    builders = {name: scope[f"case_{name}"] for name in CASES}
+    for name in cases:
+        try:
+            builders[name]()
+        except ImportError as e:
+            results[name] = {"skipped": f"missing dependency: {e.name}"}
+            continue
+        _, results[name] = measure(builders[name], rows, repeat)
+        results[name].update(extra.get(name, {}))
+    return results
+
+
+def compare(results, baselines, rows, tolerance):
+    """
+    Regressions against stored baselines for the same row count.
+    Returns (regressions, missing), where missing lists the measured
+    cases with no baseline entry.
+    """
+    regressions, missing = [], []
+    for name, m in results.items():
+        if "seconds" not in m:
+            continue
+        base = baselines.get(f"{name}@{rows}")
+        if not base:
+            missing.append(f"{name}@{rows}")
+            continue
+        for key in ("seconds", "peak_mb"):
+            if base.get(key) and m[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {m[key]} > baseline {base[key]}")
+    return regressions, missing
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark the SOC pipeline stages")
+    p.add_argument("--rows", type=int, default=100_000)
+    p.add_argument("--cases", default=",".join(CASES))
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--repeat", type=int, default=3, help="timed runs per case (best is kept)")
+    p.add_argument("--tolerance", type=float, default=0.25,
+                   help="allowed fractional slowdown / memory growth vs. baseline")
+    p.add_argument("--baseline", default=BASELINE_PATH)
+    p.add_argument("--save-baseline", action="store_true")
+    p.add_argument("--allow-missing-baseline", action="store_true",
+                   help="warn instead of failing when a case has no baseline")
+    args = p.parse_args()
+
+    cases = [c for c in args.cases.split(",") if c]
+    results = run_cases(args.rows, cases, seed=args.seed, repeat=args.repeat)
+
+    print(f"{'case':<26}{'seconds':>10}{'rows/s':>14}{'peak MB':>10}")
+    for name, m in results.items():
+        if "skipped" in m:
+            print(f"{name:<26}  skipped ({m['skipped']})")
+        else:
+            print(f"{name:<26}{m['seconds']:>10}{m['rows_per_sec']:>14}{m['peak_mb']:>10}")
+            if "worker_peak_rss_mb" in m:
+                print(f"{'':<26}workers peak RSS {m['worker_peak_rss_mb']} MB, phases {m['phase_seconds']}")
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        for name, m in results.items():
+            if "seconds" in m:
+                baselines[f"{name}@{args.rows}"] = m
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"[INFO] Baselines saved: {args.baseline}")
+        return
+
+    regressions, missing = compare(results, baselines, args.rows, args.tolerance)
+    for r in regressions:
+        print(f"[REGRESSION] {r}")
+    for m in missing:
+        print(f"[WARN] No baseline for {m} in {args.baseline}; run with --save-baseline")
+    if regressions:
+        sys.exit(1)
+    sys.exit(2 if missing and not args.allow_missing_baseline else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Deterministic synthetic Zeek/Corelight data generator.
+
+Writes conn, dns, ssh, dhcp and http records either as Corelight NDJSON
+(optionally wrapped in `_raw`, like the API exports) or as Zeek TSV logs,
+with optional injected attack patterns and a ground-truth manifest.
+
+    python -m bench.synth --rows 1000000 --format ndjson --out data/synthetic
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+PATH_MIX = {"conn": 0.70, "dns": 0.20, "http": 0.05, "ssh": 0.03, "dhcp": 0.02}
+
+# Zeek field names and TSV types per log
+FIELDS = {
+    "conn": [
+        ("ts", "time"), ("uid", "string"), ("id.orig_h", "addr"), ("id.orig_p", "port"),
+        ("id.resp_h", "addr"), ("id.resp_p", "port"), ("proto", "enum"),
+        ("service", "string"), ("duration", "interval"), ("orig_bytes", "count"),
+        ("resp_bytes", "count"), ("conn_state", "string"),
+    ],
+    "dns": [
+        ("ts", "time"), ("uid", "string"), ("id.orig_h", "addr"), ("id.orig_p", "port"),
+        ("id.resp_h", "addr"), ("id.resp_p", "port"), ("proto", "enum"),
+        ("query", "string"), ("qtype_name", "string"), ("rcode_name", "string"),
+        ("answers", "vector[string]"),
+    ],
+    "http": [
+        ("ts", "time"), ("uid", "string"), ("id.orig_h", "addr"), ("id.orig_p", "port"),
+        ("id.resp_h", "addr"), ("id.resp_p", "port"), ("method", "string"),
+        ("host", "string"), ("uri", "string"), ("status_code", "count"),
+        ("user_agent", "string"),
+    ],
+    "ssh": [
+        ("ts", "time"), ("uid", "string"), ("id.orig_h", "addr"), ("id.orig_p", "port"),
+        ("id.resp_h", "addr"), ("id.resp_p", "port"), ("auth_success", "bool"),
+        ("auth_attempts", "count"), ("client", "string"), ("server", "string"),
+    ],
+    "dhcp": [
+        ("ts", "time"), ("uid", "string"), ("id.orig_h", "addr"), ("id.orig_p", "port"),
+        ("id.resp_h", "addr"), ("id.resp_p", "port"), ("mac", "string"),
+        ("assigned_addr", "addr"), ("msg_type", "string"), ("hostname", "string"),
+        ("vendor_class", "string"),
+    ],
+}
+
+ATTACKS = ["port_scan", "horizontal_scan", "beacon", "ssh_bruteforce",
+           "dns_tunnel", "rogue_dhcp", "exfil", "http_cmd"]
+
+COMMON_PORTS = np.array([443, 80, 53, 22, 445, 3389, 8080, 123])
+PORT_WEIGHTS = np.array([0.45, 0.2, 0.15, 0.05, 0.05, 0.03, 0.05, 0.02])
+CONN_STATES = np.array(["SF", "S0", "REJ", "RSTO", "OTH", "S1"])
+STATE_WEIGHTS = np.array([0.78, 0.08, 0.04, 0.03, 0.04, 0.03])
+DOMAINS = np.array(["example.com", "corp.local", "cdn.example.net", "updates.vendor.io",
+                    "mail.example.org", "api.service.dev", "static.assets.cloud"])
+URIS = np.array(["/", "/index.html", "/login", "/api/v1/items", "/static/app.js",
+                 "/images/logo.png", "/search?q=report"])
+AGENTS = np.array(["Mozilla/5.0", "curl/8.4.0", "python-requests/2.31", "Go-http-client/1.1"])
+
+
+class _Hosts:
+    """
+    Fixed, seeded address pools shared by background and attack traffic.
+    """
+    def __init__(self, rng, internal=2000, external=5000):
+        i = np.arange(internal)
+        self.internal = np.array([f"10.{(k >> 8) & 255}.{k & 255}.{(k % 250) + 2}"
+                                  for k in i], dtype=object)
+        e = rng.integers(1, 2**24, external)
+        self.external = np.array([f"{(k >> 16) % 200 + 20}.{(k >> 8) & 255}.{k & 255}.{k % 254 + 1}"
+                                  for k in e], dtype=object)
+        self.dns_server = "10.0.0.53"
+        self.dhcp_server = "10.0.0.1"
+
+
+def _uids(rng, n):
+    return "C" + pd.Series(rng.integers(0, 2**62, n)).map("{:016x}".format).to_numpy(dtype=object)
+
+
+def _background(rng, hosts, path, ts):
+    """
+    Benign records for one log type, built column-wise.
+    """
+    n = len(ts)
+    orig = hosts.internal[rng.integers(0, len(hosts.internal), n)]
+    frame = {"ts": ts, "uid": _uids(rng, n), "id.orig_h": orig,
+             "id.orig_p": rng.integers(1024, 65535, n)}
+
+    if path == "conn":
+        port = rng.choice(COMMON_PORTS, n, p=PORT_WEIGHTS)
+        frame.update({
+            "id.resp_h": hosts.external[rng.integers(0, len(hosts.external), n)],
+            "id.resp_p": port,
+            "proto": np.where(np.isin(port, [53, 123]), "udp", "tcp"),
+            "service": np.select([port == 443, port == 80, port == 53, port == 22],
+                                 ["ssl", "http", "dns", "ssh"], "-"),
+            "duration": np.round(rng.exponential(2.0, n), 6),
+            "orig_bytes": rng.lognormal(6, 1.5, n).astype(np.int64),
+            "resp_bytes": rng.lognormal(8, 2.0, n).astype(np.int64),
+            "conn_state": rng.choice(CONN_STATES, n, p=STATE_WEIGHTS),
+        })
+    elif path == "dns":
+        sub = rng.integers(0, 50, n)
+        frame.update({
+            "id.resp_h": hosts.dns_server, "id.resp_p": 53, "proto": "udp",
+            "query": [f"h{s}.{d}" for s, d in zip(sub, rng.choice(DOMAINS, n))],
+            "qtype_name": rng.choice(["A", "AAAA", "PTR", "TXT"], n, p=[0.7, 0.2, 0.07, 0.03]),
+            "rcode_name": rng.choice(["NOERROR", "NXDOMAIN"], n, p=[0.93, 0.07]),
+            "answers": hosts.external[rng.integers(0, len(hosts.external), n)],
+        })
+    elif path == "http":
+        frame.update({
+            "id.resp_h": hosts.external[rng.integers(0, len(hosts.external), n)],
+            "id.resp_p": 80, "method": rng.choice(["GET", "POST"], n, p=[0.85, 0.15]),
+            "host": rng.choice(DOMAINS, n), "uri": rng.choice(URIS, n),
+            "status_code": rng.choice([200, 301, 404, 500], n, p=[0.85, 0.06, 0.07, 0.02]),
+            "user_agent": rng.choice(AGENTS, n),
+        })
+    elif path == "ssh":
+        frame.update({
+            "id.resp_h": hosts.internal[rng.integers(0, len(hosts.internal), n)],
+            "id.resp_p": 22, "auth_success": rng.random(n) < 0.95,
+            "auth_attempts": rng.integers(1, 3, n),
+            "client": "SSH-2.0-OpenSSH_9.6", "server": "SSH-2.0-OpenSSH_8.9",
+        })
+    elif path == "dhcp":
+        frame.update({
+            "id.resp_h": hosts.dhcp_server, "id.orig_p": 68, "id.resp_p": 67,
+            "mac": [f"00:16:3e:{(k >> 16) & 255:02x}:{(k >> 8) & 255:02x}:{k & 255:02x}"
+                    for k in rng.integers(0, 2**24, n)],
+            "assigned_addr": orig,
+            "msg_type": rng.choice(["DISCOVER", "OFFER", "REQUEST", "ACK"], n),
+            "hostname": [f"ws-{k:04d}" for k in rng.integers(0, 5000, n)],
+            "vendor_class": "MSFT 5.0",
+        })
+    return pd.DataFrame(frame)
+
+
+def _attack(rng, hosts, name, t0, span):
+    """
+    Records for one injected attack pattern, keyed by log type.
+    Returns ({path: DataFrame}, manifest entry).
+    """
+    src = hosts.internal[rng.integers(0, len(hosts.internal))]
+    ext = hosts.external[rng.integers(0, len(hosts.external))]
+    start = t0 + rng.uniform(0.1, 0.5) * span
+
+    def rows(path, n, ts, **cols):
+        base = {"ts": ts, "uid": _uids(rng, n), "id.orig_h": src,
+                "id.orig_p": rng.integers(1024, 65535, n)}
+        base.update(cols)
+        return {path: pd.DataFrame(base)}
+
+    if name == "port_scan":
+        n = 1024
+        out = rows("conn", n, start + np.sort(rng.uniform(0, 120, n)),
+                   **{"id.resp_h": hosts.internal[0], "id.resp_p": np.arange(1, n + 1),
+                      "proto": "tcp", "service": "-", "duration": 0.0, "orig_bytes": 0,
+                      "resp_bytes": 0, "conn_state": rng.choice(["S0", "REJ"], n)})
+        dst = hosts.internal[0]
+    elif name == "horizontal_scan":
+        n = 300
+        out = rows("conn", n, start + np.sort(rng.uniform(0, 120, n)),
+                   **{"id.resp_h": hosts.internal[1:n + 1], "id.resp_p": 445, "proto": "tcp",
+                      "service": "-", "duration": 0.0, "orig_bytes": 0, "resp_bytes": 0,
+                      "conn_state": "S0"})
+        dst = "*"
+    elif name == "beacon":
+        n = max(20, int(span * 0.4 // 60))
+        out = rows("conn", n, start + np.arange(n) * 60.0 + rng.normal(0, 1.5, n),
+                   **{"id.resp_h": ext, "id.resp_p": 8443, "proto": "tcp", "service": "ssl",
+                      "duration": 0.2, "orig_bytes": 350, "resp_bytes": 120,
+                      "conn_state": "SF"})
+        dst = ext
+    elif name == "ssh_bruteforce":
+        n = 60
+        dst = hosts.internal[2]
+        out = rows("ssh", n, start + np.sort(rng.uniform(0, 600, n)),
+                   **{"id.resp_h": dst, "id.resp_p": 22, "auth_success": False,
+                      "auth_attempts": rng.integers(6, 30, n), "client": "SSH-2.0-libssh",
+                      "server": "SSH-2.0-OpenSSH_8.9"})
+    elif name == "dns_tunnel":
+        n = 200
+        labels = pd.Series(rng.integers(0, 2**62, n)).map("{:016x}".format)
+        out = rows("dns", n, start + np.sort(rng.uniform(0, 900, n)),
+                   **{"id.resp_h": hosts.dns_server, "id.resp_p": 53, "proto": "udp",
+                      "query": (labels + ".base64.exfil-tunnel.onion").to_numpy(dtype=object),
+                      "qtype_name": "TXT", "rcode_name": "NOERROR", "answers": "-"})
+        dst = hosts.dns_server
+    elif name == "rogue_dhcp":
+        n = 20
+        dst = "10.0.99.1"
+        out = rows("dhcp", n, start + np.sort(rng.uniform(0, 300, n)),
+                   **{"id.resp_h": dst, "id.orig_p": 68, "id.resp_p": 67,
+                      "mac": "de:ad:be:ef:00:01", "assigned_addr": src,
+                      "msg_type": "OFFER", "hostname": "rogue", "vendor_class": "-"})
+    elif name == "exfil":
+        n = 5
+        out = rows("conn", n, start + np.sort(rng.uniform(0, 300, n)),
+                   **{"id.resp_h": ext, "id.resp_p": 443, "proto": "tcp", "service": "ssl",
+                      "duration": 120.0, "orig_bytes": rng.integers(5 * 10**7, 2 * 10**8, n),
+                      "resp_bytes": 4096, "conn_state": "SF"})
+        dst = ext
+    elif name == "http_cmd":
+        n = 10
+        out = rows("http", n, start + np.sort(rng.uniform(0, 300, n)),
+                   **{"id.resp_h": ext, "id.resp_p": 80, "method": "GET", "host": ext,
+                      "uri": rng.choice(["/cmd.exe?c=whoami", "/run?x=powershell -enc AA"], n),
+                      "status_code": 200, "user_agent": "Mozilla/4.0"})
+        dst = ext
+    else:
+        raise ValueError(f"Unknown attack pattern: {name}")
+
+    entry = {"attack": name, "src": src, "dst": dst, "rows": n,
+             "start": float(start)}
+    return out, entry
+
+
+def iter_chunks(rows, seed=0, start="2025-01-01", duration="1D", attacks=(),
+                chunk_rows=250_000, hosts=None):
+    """
+    Yield (path, DataFrame) pairs, `chunk_rows` records at a time, with `ts`
+    as epoch seconds. Attack records are yielded last. The final item is
+    ("manifest", list of injected attacks).
+    """
+    rng = np.random.default_rng(seed)
+    hosts = hosts or _Hosts(rng)
+    t0 = pd.Timestamp(start).timestamp()
+    span = pd.Timedelta(duration).total_seconds()
+    paths = list(PATH_MIX)
+    probs = np.array(list(PATH_MIX.values()))
+
+    n_chunks = max(1, -(-rows // chunk_rows))
+    for c in range(n_chunks):
+        n = min(chunk_rows, rows - c * chunk_rows)
+        ts = t0 + (c + np.sort(rng.random(n))) * span / n_chunks
+        which = rng.choice(len(paths), n, p=probs)
+        for i, path in enumerate(paths):
+            mask = which == i
+            if mask.any():
+                yield path, _background(rng, hosts, path, np.round(ts[mask], 6))
+
+    manifest = []
+    for name in attacks:
+        out, entry = _attack(rng, hosts, name, t0, span)
+        manifest.append(entry)
+        for path, frame in out.items():
+            frame["ts"] = np.round(frame["ts"].to_numpy(dtype=float), 6)
+            yield path, frame
+    yield "manifest", manifest
+
+
+def generate_frame(rows, **kwargs):
+    """
+    In-memory equivalent of a loaded dataset: one DataFrame with `_path`
+    and a datetime `ts`, sorted by time. Returns (df, manifest).
+    """
+    frames, manifest = [], []
+    for path, frame in iter_chunks(rows, **kwargs):
+        if path == "manifest":
+            manifest = frame
+            continue
+        frames.append(frame.assign(_path=path))
+    df = pd.concat(frames, ignore_index=True)
+    df["ts"] = pd.to_datetime(df["ts"], unit="s")
+    return df.sort_values("ts", ignore_index=True), manifest
+
+
+def _ndjson_lines(path, frame, raw):
+    out = frame.assign(_path=path)
+    out["ts"] = pd.to_datetime(out["ts"], unit="s").dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    inner = out.to_json(orient="records", lines=True).splitlines()
+    if not raw:
+        return inner
+    outer = pd.DataFrame({"_time": frame["ts"].to_numpy(), "sourcetype": f"corelight_{path}",
+                          "_raw": inner})
+    return outer.to_json(orient="records", lines=True, double_precision=6).splitlines()
+
+
+def _zeek_header(path, fields):
+    names = "\t".join(n for n, _ in fields)
+    types = "\t".join(t for _, t in fields)
+    return ("#separator \\x09\n#set_separator\t,\n#empty_field\t(empty)\n"
+            "#unset_field\t-\n"
+            f"#path\t{path}\n#open\t1970-01-01-00-00-00\n"
+            f"#fields\t{names}\n#types\t{types}\n")
+
+
+def write_dataset(out_dir, rows, fmt="ndjson", raw=True, **kwargs):
+    """
+    Stream a synthetic dataset to disk chunk by chunk (memory stays flat
+    from 10k to 100M rows). NDJSON goes to `<out_dir>/synthetic.json`; Zeek
+    TSV to one `<path>.log` per log type. A `manifest.json` records the
+    injected attacks. Returns the list of written data files.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    handles = {}
+
+    def handle(path):
+        if fmt == "ndjson":
+            path = "synthetic"
+            name = os.path.join(out_dir, "synthetic.json")
+        else:
+            name = os.path.join(out_dir, f"{path}.log")
+        if path not in handles:
+            handles[path] = open(name, "w")
+            if fmt == "zeek":
+                handles[path].write(_zeek_header(path, FIELDS[path]))
+        return handles[path]
+
+    manifest = []
+    try:
+        for path, frame in iter_chunks(rows, **kwargs):
+            if path == "manifest":
+                manifest = frame
+                continue
+            f = handle(path)
+            if fmt == "ndjson":
+                f.write("\n".join(_ndjson_lines(path, frame, raw)) + "\n")
+            elif fmt == "zeek":
+                cols = [n for n, _ in FIELDS[path]]
+                frame = frame.reindex(columns=cols)
+                for name, kind in FIELDS[path]:
+                    if kind == "bool":
+                        frame[name] = np.where(frame[name].astype(bool), "T", "F")
+                frame.to_csv(
+                    f, sep="\t", header=False, index=False, na_rep="-",
+                    float_format="%.6f", lineterminator="\n")
+            else:
+                raise ValueError(f"Unsupported format: {fmt}")
+    finally:
+        for f in handles.values():
+            if fmt == "zeek":
+                f.write("#close\t1970-01-01-00-00-00\n")
+            f.close()
+
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump({"rows": rows, "format": fmt, "attacks": manifest}, f, indent=2)
+    return [h.name for h in handles.values()]
+
+
+def main():
+    p = argparse.ArgumentParser(description="Generate synthetic Zeek/Corelight logs")
+    p.add_argument("--rows", type=int, default=10_000)
+    p.add_argument("--format", choices=["ndjson", "zeek"], default="ndjson")
+    p.add_argument("--no-raw", action="store_true", help="NDJSON without _raw wrapping")
+    p.add_argument("--out", default="data/synthetic")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--start", default="2025-01-01")
+    p.add_argument("--duration", default="1D")
+    p.add_argument("--attacks", default=",".join(ATTACKS),
+                   help="comma-separated subset of: " + ", ".join(ATTACKS))
+    args = p.parse_args()
+
+    attacks = [a for a in args.attacks.split(",") if a]
+    files = write_dataset(args.out, args.rows, fmt=args.format, raw=not args.no_raw,
+                          seed=args.seed, start=args.start, duration=args.duration,
+                          attacks=attacks)
+    print(f"[INFO] Wrote {args.rows} rows (+{len(attacks)} attacks): {', '.join(files)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import faiss, numpy as np
 from sentence_transformers import SentenceTransformer
+from metrics import stage, EMBEDDING_LATENCY
 
 class EmbeddingIndex:
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name="all-MiniLM-L6-v2", encoder=None):
+        # Pass an already-loaded encoder to build extra indexes cheaply
+        self.model = encoder or SentenceTransformer(model_name)
         self.dim = self.model.get_sentence_embedding_dimension()
         self.index = faiss.IndexFlatIP(self.dim)
         self.docs = []
@@ -11,14 +13,27 @@ class EmbeddingIndex:
     def add_docs(self, docs):
         texts = [d["text"] for d in docs]
         ids = [d["id"] for d in docs]
-        vecs = self.model.encode(texts, convert_to_numpy=True).astype("float32")
+        with EMBEDDING_LATENCY.time(op="add_docs"):
+            vecs = self.model.encode(texts, convert_to_numpy=True).astype("float32")
         faiss.normalize_L2(vecs)
         self.index.add(vecs)
         self.docs.extend(docs)
         self.ids = ids
 
+    def search(self, query, k=3):
+        """
+        (doc, score) pairs for the k most similar docs, best first.
+        """
+        if not self.docs:
+            return []
+        with stage("retrieval", rows_in=len(self.docs)) as s:
+            with EMBEDDING_LATENCY.time(op="query"):
+                qv = self.model.encode([query], convert_to_numpy=True).astype("float32")
+            faiss.normalize_L2(qv)
+            D, I = self.index.search(qv, min(k, len(self.docs)))
+            hits = [(self.docs[i], float(d)) for d, i in zip(D[0], I[0]) if i >= 0]
+            s.rows_out = len(hits)
+        return hits
+
     def retrieve(self, query, k=3):
-        qv = self.model.encode([query], convert_to_numpy=True).astype("float32")
-        faiss.normalize_L2(qv)
-        D, I = self.index.search(qv, k)
-        return [self.docs[i]["text"] for i in I[0]]
+        return [doc["text"] for doc, _ in self.search(query, k)]
@@ -0,0 +1,250 @@
+"""
+Lightweight pipeline instrumentation: per-stage timing, memory and row
+counters, latency histograms, and Prometheus text exposition.
+
+Each update is a perf_counter read plus a dict update under a lock, so it
+is cheap enough to leave on. Per-stage memory is the peak growth above the
+stage's starting point. It is exact when the stage raises the high-water
+mark; otherwise it is the growth from start to end, a lower bound. The
+default source is RSS (getrusage for the peak). Set TRACE_MEMORY (or
+`metrics_trace_memory` in config.yaml) to measure Python-heap growth with
+tracemalloc instead.
+
+Both sources are process-wide. Stages running concurrently on other
+threads (e.g. background report rendering) are counted in each other's
+numbers, and a stage never resets the tracemalloc peak while another
+traced stage is open.
+"""
+import bisect
+import contextvars
+import resource
+import sys
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from threading import Lock
+
+TRACE_MEMORY = False
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+STAGE_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+_lock = Lock()
+_trace = contextvars.ContextVar("mcp_soc_trace", default=None)
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _fmt_labels(key, extra=None):
+    items = list(key) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name, self.help = name, help_text
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _labels(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_fmt_labels(k)} {v}" for k, v in self.values.items()]
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        with _lock:
+            self.values[_labels(labels)] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name, self.help = name, help_text
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = _labels(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, c in zip(self.buckets + ("+Inf",), counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, {'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("mcp_soc_stage_seconds", "Wall time per pipeline stage", STAGE_BUCKETS)
+STAGE_ROWS_IN = Counter("mcp_soc_stage_rows_in_total", "Rows entering each stage")
+STAGE_ROWS_OUT = Counter("mcp_soc_stage_rows_out_total", "Rows produced by each stage")
+STAGE_PEAK_MEMORY = Gauge("mcp_soc_stage_peak_memory_delta_bytes",
+                          "Peak memory growth during the last run of each stage, above its "
+                          "starting point (RSS, or Python heap when memory tracing is on); "
+                          "process-wide, so concurrent stages include each other's allocations")
+STAGE_ERRORS = Counter("mcp_soc_stage_errors_total", "Stages that raised")
+OLLAMA_LATENCY = Histogram("mcp_soc_ollama_latency_seconds", "Ollama completion latency")
+EMBEDDING_LATENCY = Histogram("mcp_soc_embedding_latency_seconds", "Embedding encode latency")
+REQUEST_SECONDS = Histogram("mcp_soc_request_seconds", "HTTP request latency", LATENCY_BUCKETS)
+
+REGISTRY = [STAGE_SECONDS, STAGE_ROWS_IN, STAGE_ROWS_OUT, STAGE_PEAK_MEMORY, STAGE_ERRORS,
+            OLLAMA_LATENCY, EMBEDDING_LATENCY, REQUEST_SECONDS]
+
+
+_PAGE_SIZE = resource.getpagesize()
+_open_traced = 0
+
+
+def peak_rss():
+    """
+    This process's resident set size high-water mark, in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _current_rss():
+    """
+    Resident set size now; falls back to the peak where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return peak_rss()
+
+
+class _MemoryProbe:
+    """
+    Peak memory growth between construction and `delta()`.
+    """
+    def __init__(self):
+        global _open_traced
+        self.traced = TRACE_MEMORY and tracemalloc.is_tracing()
+        if self.traced:
+            with _lock:
+                # Resetting while another traced stage is open would erase its peak
+                if _open_traced == 0:
+                    tracemalloc.reset_peak()
+                _open_traced += 1
+            self.start, self.start_peak = tracemalloc.get_traced_memory()
+        else:
+            self.start, self.start_peak = _current_rss(), peak_rss()
+
+    def delta(self):
+        global _open_traced
+        if self.traced:
+            current, peak = tracemalloc.get_traced_memory()
+            with _lock:
+                _open_traced -= 1
+        else:
+            current, peak = _current_rss(), peak_rss()
+        if peak > self.start_peak:
+            # The high-water mark was set during this stage
+            return max(peak - self.start, 0)
+        return max(current - self.start, 0)
+
+
+class StageRecord:
+    """
+    Handle yielded by `stage`; set `rows_out` before the block exits.
+    """
+    __slots__ = ("name", "rows_in", "rows_out", "seconds", "peak_delta_bytes")
+
+    def __init__(self, name, rows_in=None):
+        self.name, self.rows_in = name, rows_in
+        self.rows_out = self.seconds = self.peak_delta_bytes = None
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """
+    Time a pipeline stage and record memory and row counts.
+
+        with stage("ingest") as s:
+            df = load(...)
+            s.rows_out = len(df)
+    """
+    rec = StageRecord(name, rows_in)
+    probe = _MemoryProbe()
+    start = time.perf_counter()
+    try:
+        yield rec
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        rec.seconds = time.perf_counter() - start
+        rec.peak_delta_bytes = probe.delta()
+        STAGE_SECONDS.observe(rec.seconds, stage=name)
+        STAGE_PEAK_MEMORY.set(rec.peak_delta_bytes, stage=name)
+        if rec.rows_in is not None:
+            STAGE_ROWS_IN.inc(rec.rows_in, stage=name)
+        if rec.rows_out is not None:
+            STAGE_ROWS_OUT.inc(rec.rows_out, stage=name)
+        trace = _trace.get()
+        if trace is not None:
+            trace["stages"].append(rec.as_dict())
+
+
+def enable_memory_tracing(enabled=True):
+    global TRACE_MEMORY
+    TRACE_MEMORY = enabled
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def start_trace(trace_id=None):
+    """
+    Begin a per-request trace in the current context; returns the trace id.
+    """
+    trace_id = trace_id or uuid.uuid4().hex
+    _trace.set({"trace_id": trace_id, "stages": []})
+    return trace_id
+
+
+def current_trace():
+    return _trace.get()
+
+
+def render_prometheus():
+    """
+    All metrics in Prometheus text exposition format.
+    """
+    with _lock:
+        lines = [line for metric in REGISTRY for line in metric.render()]
+    return "\n".join(lines) + "\n"
@@ -1,13 +1,22 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
+import json
+import time
+import uuid
 import yaml
-from utils import extract_text_from_pdf, generate_pdf_report, print_timeline_to_terminal
-from embeddings import EmbeddingIndex
+from utils import (extract_text_from_pdf, print_timeline_to_terminal,
+                   render_report_async, REPORT_FORMATS, REPORT_JOBS)
 from agents.collector import collect_logs
 # from agents.analyzer import generate_alerts, make_timeline, map_timeline_to_mitre, fast_mitre_map, detect_unusual_ports
 from agents.analyzer import generate_alerts, make_timeline
 from agents.reporter import query_tactic
-# from agents.summarizer import summarize_dataset, generate_pdf_report
-from threading import Thread
+from agents.query import LogIndex
+from agents import parallel
+from metrics import (stage, start_trace, current_trace, render_prometheus,
+                     enable_memory_tracing, REQUEST_SECONDS)
+from threading import Lock, Thread
+
+# Analyzer pool workers import this script as __mp_main__, so the
+# encoder (faiss/torch), transformers and DuckDB are imported where used.
 
 # ----------------------------------------------------------
 # Configuration
@@ -18,29 +27,66 @@ with open("config.yaml") as f:
 OLLAMA_MODEL = cfg["ollama_model"]
 EMBED_MODEL = cfg["embedding_model"]
 
+if cfg.get("metrics_trace_memory") and __name__ != "__mp_main__":
+    enable_memory_tracing()
+
 app = Flask(__name__)
 
 # ----------------------------------------------------------
 # Corpus: Corelight PDF + MITRE tactics
 # ----------------------------------------------------------
-corelight_text = extract_text_from_pdf("data/Corelight-cheatsheet-poster.pdf")
 mitre_seed = {
     "Reconnaissance": "Information gathering: scanning, enumeration.",
     "Discovery": "Identifying internal assets and topology.",
     "Exfiltration": "Extracting data from systems.",
     "Command and Control": "Maintaining remote access."
 }
-docs = [{"id": f"mitre_{k}", "text": f"{k}: {v}"} for k,v in mitre_seed.items()]
-docs.append({"id":"corelight","text":corelight_text})
+_embed_index = None
+_embed_lock = Lock()
 
-embed_index = EmbeddingIndex(EMBED_MODEL)
-embed_index.add_docs(docs)
+
+def get_embed_index():
+    """
+    Build the reference corpus index on first use. Kept out of module
+    import so analyzer pool workers, which re-import this script under
+    forkserver/spawn, don't extract the PDF or load the encoder.
+    """
+    global _embed_index
+    from embeddings import EmbeddingIndex
+    with _embed_lock:
+        if _embed_index is None:
+            corelight_text = extract_text_from_pdf("data/Corelight-cheatsheet-poster.pdf")
+            docs = [{"id": f"mitre_{k}", "text": f"{k}: {v}"} for k,v in mitre_seed.items()]
+            docs.append({"id":"corelight","text":corelight_text})
+            index = EmbeddingIndex(EMBED_MODEL)
+            index.add_docs(docs)
+            _embed_index = index
+    return _embed_index
 
 # ----------------------------------------------------------
 # Pipeline memory
 # ----------------------------------------------------------
 incident_cache = {}
 
+# ----------------------------------------------------------
+# Instrumentation
+# ----------------------------------------------------------
+@app.before_request
+def begin_trace():
+    g.trace_id = start_trace(request.headers.get("X-Trace-Id"))
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def end_trace(response):
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                            endpoint=request.endpoint or "unknown")
+    response.headers["X-Trace-Id"] = g.trace_id
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 # ----------------------------------------------------------
 # Endpoints
 # ----------------------------------------------------------
@@ -48,31 +94,63 @@ incident_cache = {}
 def collect():
     df, stats = collect_logs("data/AI_MCP_ENG.json")
     incident_cache["df"] = df
-    return jsonify(stats)
+    incident_cache["incident_id"] = uuid.uuid4().hex
+    incident_cache["timeline"] = []
+    with stage("index", rows_in=len(df)):
+        incident_cache["index"] = LogIndex(df)
+    return jsonify({**stats, "trace": current_trace()})
 
 @app.route("/analyzer", methods=["GET"])
 def analyze():
-    df = incident_cache.get("df")
-    if df is None:
-        return jsonify({"error":"No logs loaded"}),400
+    backend = request.args.get("backend", cfg.get("analyzer_backend", "pandas"))
+    report_format = request.args.get("report", "pdf")
+    if report_format not in REPORT_FORMATS:
+        return jsonify({"error": f"report must be one of {', '.join(REPORT_FORMATS)}"}), 400
+    if backend == "sql":
+        # Out-of-core: rules run in DuckDB directly over the files on disk
+        from agents import sql_engine
+        con = sql_engine.connect(cfg["sql_sources"], memory_limit=cfg.get("sql_memory_limit"),
+                                 threads=cfg.get("sql_threads"))
+        try:
+            alerts = sql_engine.generate_alerts(None, con=con)
+            summary = sql_engine.alert_summary(con)
+        finally:
+            sql_engine.close(con)
+    else:
+        df = incident_cache.get("df")
+        if df is None:
+            return jsonify({"error":"No logs loaded"}),400
+        if backend == "parallel":
+            # Row-range shards in a process pool; scans and beacons per source-host bucket
+            alerts, shard_stats = parallel.analyze_sharded(df, workers=cfg.get("analyzer_workers"))
+            incident_cache["shard_stats"] = shard_stats
+        else:
+            alerts = generate_alerts(df)
+        summary = alerts["type"].value_counts().to_dict() if not alerts.empty else {}
 
-    alerts = generate_alerts(df)
     if alerts.empty:
-        return jsonify({"status": "ok", "alerts": [], "summary": {}})
+        incident_cache["timeline"] = []
+        return jsonify({"status": "ok", "alerts": [], "summary": {}, "trace": current_trace()})
 
     # alerts = fast_mitre_map(alerts)
-    summary = alerts["type"].value_counts().to_dict()
     # Build summary + timeline
-    timeline = make_timeline(alerts)
+    with stage("timeline", rows_in=len(alerts)) as s:
+        timeline = make_timeline(alerts)
+        s.rows_out = len(timeline)
+    # Segments /reporter embeds and selects from for this incident
+    incident_cache["timeline"] = timeline
+    incident_cache.setdefault("incident_id", uuid.uuid4().hex)
 
     print_timeline_to_terminal(summary, timeline)
 
-    # Generate PDF report
-    # pdf_path = generate_pdf_report(summary=summary, timeline=timeline)
-    
+    # Generate report off the request thread
+    report_job = render_report_async(summary, timeline, alerts=alerts, fmt=report_format)
+
     return jsonify({
         "status": "ok",
         "summary": summary,
+        "report_job": report_job,
+        "trace": current_trace(),
         "alerts": alerts.to_dict(orient="records")
     })
     # alerts = fast_mitre_map(alerts)
@@ -84,35 +162,105 @@ def analyze():
     # incident_cache["timeline"] = mapped
     # return jsonify(mapped)
 
+@app.route("/query", methods=["GET"])
+def query():
+    """
+    Pivot query over the loaded logs, e.g.
+    /query?host=10.0.0.5&_path=conn,dns&start=2025-01-01T14:00&end=2025-01-01T14:10
+    Comma-separated values are OR-ed; different parameters are AND-ed.
+    """
+    index = incident_cache.get("index")
+    if index is None:
+        return jsonify({"error": "No logs loaded. Run /collector first."}), 400
+
+    args = request.args.to_dict()
+    limit = args.pop("limit", 1000)
+    start, end = args.pop("start", None), args.pop("end", None)
+    host = args.pop("host", None)
+    filters = {k.replace(".", "_"): v.split(",") for k, v in args.items()}
+
+    try:
+        limit = int(limit)
+        if limit < 0:
+            raise ValueError(f"limit must be non-negative, got {limit}")
+        with stage("query") as s:
+            total, rows = index.query(start=start, end=end, limit=limit,
+                                      host=host.split(",") if host else None, **filters)
+            s.rows_out = total
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "count": total,
+        "returned": len(rows),
+        "rows": json.loads(rows.to_json(orient="records", date_format="iso")),
+        "trace": current_trace()
+    })
+
+@app.route("/reports/<job_id>", methods=["GET"])
+def report_status(job_id):
+    job = REPORT_JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown report job"}), 404
+    return jsonify({"job_id": job_id, **job})
+
 @app.route("/reporter", methods=["POST"])
 def report():
     data = request.json
     tactic = data.get("tactic")
     mapped = incident_cache.get("timeline", [])
-    result = query_tactic(tactic, mapped, embed_index.retrieve, OLLAMA_MODEL)
-    return jsonify({"tactic": tactic, "response": result})
+    embed_index = get_embed_index()
+    result = query_tactic(tactic, mapped, embed_index.retrieve, OLLAMA_MODEL,
+                          incident_id=incident_cache.get("incident_id"),
+                          encoder=embed_index.model,
+                          top_k=cfg.get("reporter_top_k", 8),
+                          token_budget=cfg.get("reporter_token_budget", 3000))
+    return jsonify({"tactic": tactic, "response": result, "trace": current_trace()})
 
 @app.route("/summarizer", methods=["POST"])
 def summarizer():
     global incident_cache
-    df = incident_cache.get("df")
-    if df is None:
-        return jsonify({"error": "No dataset loaded. Run /collector first."}), 400
-
     data = request.get_json(force=True)
     event_filter = data.get("event_filter", "dhcp")
+    backend = data.get("backend", cfg.get("analyzer_backend", "pandas"))
+
+    df = incident_cache.get("df")
+    if df is None and backend != "sql":
+        return jsonify({"error": "No dataset loaded. Run /collector first."}), 400
 
     try:
-        summary_text, stats = summarize_dataset(df, event_filter=event_filter)
-        output_path = generate_pdf_report(summary_text, stats, f"store/soc_summary_{event_filter}.pdf")
+        from agents.summarizer import summarize_dataset, summarize_sample
+        if backend == "sql":
+            from agents import sql_engine
+            # Two aggregate scans; no point caching the files as Parquet
+            con = sql_engine.connect(cfg["sql_sources"], memory_limit=cfg.get("sql_memory_limit"),
+                                     threads=cfg.get("sql_threads"), cache_parquet=False)
+            try:
+                stats = sql_engine.dataset_stats(con, event_filter)
+                sample = sql_engine.sample_events(con, event_filter)
+            finally:
+                sql_engine.close(con)
+            if not stats["rows"]:
+                summary_text, stats = f"No {event_filter.upper()} data found to summarize.", {}
+            else:
+                with stage("summarization", rows_in=len(sample)):
+                    summary_text, stats = summarize_sample(sample, stats, event_filter)
+        else:
+            with stage("summarization", rows_in=len(df)):
+                summary_text, stats = summarize_dataset(df, event_filter=event_filter)
+        # Render off the request thread; poll /reports/<job_id>
+        report_job = render_report_async(None, None, stats, summary_text=summary_text)
         return jsonify({
             "status": "ok",
-            "pdf_path": output_path,
+            "report_job": report_job,
+            "pdf_path": REPORT_JOBS[report_job]["path"],
             "event_filter": event_filter,
-            "summary_excerpt": summary_text[:300] + "..."
+            "summary_excerpt": summary_text[:300] + "...",
+            "trace": current_trace()
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
 if __name__ == "__main__":
+    get_embed_index()
     app.run(host="0.0.0.0", port=cfg["port"])
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from agents.analyzer import generate_alerts, make_timeline
+
+
+def _conn(ts, src, dst, port, state="SF"):
+    return {"_path": "conn", "ts": ts, "id.orig_h": src, "id.resp_h": dst,
+            "id.resp_p": port, "conn_state": state, "orig_bytes": 100, "resp_bytes": 100}
+
+
+def _tz_aware_conn():
+    rows = []
+    scan_start = pd.Timestamp("2025-01-01T08:31:00Z")
+    for port in range(150):
+        rows.append(_conn(scan_start + pd.Timedelta(seconds=port), "10.0.0.66", "10.0.0.5", port))
+    beacon_start = pd.Timestamp("2025-01-01T10:00:00Z")
+    for i in range(20):
+        rows.append(_conn(beacon_start + pd.Timedelta(seconds=60 * i), "10.0.0.7", "203.0.113.9", 443))
+    rows.append(_conn(pd.Timestamp("2025-01-01T12:00:00Z"), "10.0.0.8", "10.0.0.9", 22, "REJ"))
+    # Corelight-style ISO strings, as produced by the collector
+    df = pd.DataFrame(rows)
+    df["ts"] = df["ts"].dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    return df
+
+
+def test_scan_and_beacon_timestamps_survive_timeline():
+    alerts = generate_alerts(_tz_aware_conn())
+    by_type = alerts.set_index("type")["ts"]
+    assert by_type["Vertical Port Scan"] == pd.Timestamp("2025-01-01T08:30:00Z")
+    assert by_type["Beaconing"] == pd.Timestamp("2025-01-01T10:00:00Z")
+
+    timeline = make_timeline(alerts)
+    assert [line.split(" | ")[1] for line in timeline] == [
+        "Vertical Port Scan", "Beaconing", "Failed Connection"]
+    assert timeline[0].startswith("2025-01-01 08:30:00")
+    assert timeline[1].startswith("2025-01-01 10:00:00")
+
+
+def test_naive_timestamps_stay_naive():
+    df = _tz_aware_conn()
+    df["ts"] = pd.to_datetime(df["ts"]).dt.tz_localize(None)
+    alerts = generate_alerts(df)
+    assert alerts["ts"].dt.tz is None
+    assert alerts.set_index("type")["ts"]["Vertical Port Scan"] == pd.Timestamp("2025-01-01 08:30:00")
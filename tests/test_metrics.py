@@ -0,0 +1,29 @@
+import numpy as np
+
+import metrics
+from metrics import stage
+
+
+def test_stage_memory_is_a_per_stage_delta():
+    with stage("test.alloc") as big:
+        buf = np.ones(64 * 2**20 // 8)
+    del buf
+    with stage("test.noop") as small:
+        pass
+    assert big.peak_delta_bytes >= 48 * 2**20
+    assert small.peak_delta_bytes < 8 * 2**20
+
+
+def test_traced_inner_stage_keeps_outer_peak():
+    metrics.enable_memory_tracing()
+    try:
+        with stage("test.outer") as outer:
+            buf = bytearray(16 * 2**20)
+            del buf
+            with stage("test.inner") as inner:
+                pass
+        assert outer.peak_delta_bytes >= 16 * 2**20
+        assert inner.peak_delta_bytes < 2**20
+    finally:
+        metrics.enable_memory_tracing(False)
+        metrics.tracemalloc.stop()
@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from agents import analyzer, parallel
+from bench.synth import ATTACKS, generate_frame
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _pool():
+    yield
+    parallel.shutdown_pool()
+
+
+@pytest.fixture
+def frame(monkeypatch):
+    # Small shards so every log type is split across several workers' tasks
+    monkeypatch.setattr(parallel, "MIN_SHARD_ROWS", 1000)
+    df, _ = generate_frame(20_000, seed=1, attacks=ATTACKS)
+    return df
+
+
+def _comparable(alerts):
+    # Rogue DHCP is stamped with the wall clock, not a log timestamp
+    alerts = alerts[alerts["type"] != "Rogue DHCP Server"]
+    return alerts[["ts", "type", "desc"]].astype(str).reset_index(drop=True)
+
+
+def test_sharded_analyzer_matches_serial(frame):
+    expected = analyzer.generate_alerts(frame.copy())
+    alerts, stats = parallel.analyze_sharded(frame.copy(), workers=2)
+
+    assert stats["shards"] > 1 and stats["host_buckets"] > 1
+    assert {"Vertical Port Scan", "Horizontal Scan", "Beaconing"} <= set(alerts["type"])
+    pd.testing.assert_frame_equal(_comparable(alerts), _comparable(expected))
+    assert (alerts["type"] == "Rogue DHCP Server").sum() == (expected["type"] == "Rogue DHCP Server").sum()
+    assert stats["worker_peak_rss_mb"] > 0
+    assert set(stats["seconds"]) == {"prepare", "rows", "hosts", "merge"}
+
+
+def test_sharded_analyzer_keeps_timezone(frame):
+    frame["ts"] = frame["ts"].dt.tz_localize("UTC")
+    expected = analyzer.generate_alerts(frame.copy())
+    alerts, _ = parallel.analyze_sharded(frame.copy(), workers=2)
+
+    scans = alerts[alerts["type"].isin(["Vertical Port Scan", "Beaconing"])]
+    # Column is object-typed next to the naive Rogue DHCP stamp, as in serial
+    assert {str(t.tz) for t in scans["ts"]} == {"UTC"}
+    pd.testing.assert_frame_equal(_comparable(alerts), _comparable(expected))
+
+
+def test_sharded_analyzer2_matches_serial(frame):
+    pytest.importorskip("networkx")
+    from agents import analyzer2
+
+    expected = analyzer2.generate_alerts(frame.copy())
+    alerts, stats = parallel.analyze_sharded(frame.copy(), workers=2, rules="analyzer2")
+
+    assert stats["resp_bytes_q99"] == pytest.approx(frame["resp_bytes"].quantile(0.99))
+    pd.testing.assert_frame_equal(_comparable(alerts), _comparable(expected))
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agents.query import LogIndex, _key
+
+
+@pytest.fixture(scope="module")
+def logs():
+    rng = np.random.default_rng(7)
+    n = 5000
+    hosts = np.array([f"10.0.0.{i}" for i in range(12)])
+    ports = np.array([22, 53, 80, 443, 8080], dtype=object)
+    df = pd.DataFrame({
+        "ts": pd.Timestamp("2025-01-01", tz="UTC")
+        + pd.to_timedelta(rng.integers(0, 3600, n), unit="s"),
+        "_path": rng.choice(["conn", "dns", "http", "ssh"], n),
+        "id.orig_h": rng.choice(hosts, n),
+        "id.resp_h": rng.choice(hosts, n),
+        "id.resp_p": rng.choice(ports, n),
+    })
+    # Mixed column: the same port as int and as string
+    as_text = rng.random(n) < 0.3
+    df.loc[as_text, "id.resp_p"] = df.loc[as_text, "id.resp_p"].astype(str)
+    return df
+
+
+def _expected(df, start=None, end=None, host=None, paths=None, ports=None):
+    mask = np.ones(len(df), dtype=bool)
+    if start is not None:
+        mask &= df["ts"] >= pd.Timestamp(start, tz="UTC")
+    if end is not None:
+        mask &= df["ts"] < pd.Timestamp(end, tz="UTC")
+    if host:
+        mask &= df["id.orig_h"].isin(host) | df["id.resp_h"].isin(host)
+    if paths:
+        mask &= df["_path"].isin(paths)
+    if ports:
+        mask &= df["id.resp_p"].map(_key).isin([_key(p) for p in ports])
+    return df[mask].sort_values("ts", kind="stable").index.tolist()
+
+
+@pytest.mark.parametrize("query", [
+    {},
+    {"start": "2025-01-01T00:10", "end": "2025-01-01T00:40"},
+    {"host": ["10.0.0.3", "10.0.0.7"]},
+    {"host": ["10.0.0.3"], "paths": ["conn", "http"], "ports": [443]},
+    {"start": "2025-01-01T00:30", "host": ["10.0.0.1", "10.0.0.2"], "ports": ["443", 80]},
+    {"paths": ["ssh"], "ports": [8080.0], "end": "2025-01-01T00:20"},
+    {"host": ["192.0.2.1"]},
+])
+def test_query_matches_brute_force(logs, query):
+    index = LogIndex(logs)
+    kwargs = {"start": query.get("start"), "end": query.get("end"), "host": query.get("host")}
+    if "paths" in query:
+        kwargs["_path"] = query["paths"]
+    if "ports" in query:
+        kwargs["id_resp_p"] = query["ports"]
+    expected = _expected(logs, **query)
+
+    total, rows = index.query(**kwargs)
+    assert total == len(expected)
+    assert rows.index.tolist() == expected
+
+    total, rows = index.query(limit=5, **kwargs)
+    assert total == len(expected)
+    assert rows.index.tolist() == expected[:5]
+
+
+def test_port_written_two_ways_shares_one_posting_list(logs):
+    index = LogIndex(logs)
+    as_int = index.postings_for("id.resp_p", [443])
+    assert np.array_equal(as_int, index.postings_for("id.resp_p", ["443"]))
+    assert len(as_int) == (logs["id.resp_p"].map(_key) == "443").sum()
+
+
+def test_unindexed_field_is_rejected(logs):
+    with pytest.raises(KeyError):
+        LogIndex(logs).query(uid=["C1"])
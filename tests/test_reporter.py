@@ -0,0 +1,116 @@
+import sys
+import types
+
+import pytest
+
+from agents import reporter
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    calls = []
+
+    def complete(prompt, model=None):
+        calls.append(prompt)
+        return f"answer#{len(calls)}"
+
+    monkeypatch.setattr(reporter, "ollama_complete", complete)
+    monkeypatch.setattr(reporter, "_answers", reporter.OrderedDict())
+    monkeypatch.setattr(reporter, "_segment_indexes", reporter.OrderedDict())
+    return calls
+
+
+class StubIndex:
+    """
+    Ranks docs by how many words of the query they contain.
+    """
+    built = 0
+
+    def __init__(self, encoder=None):
+        StubIndex.built += 1
+        self.docs = []
+
+    def add_docs(self, docs):
+        self.docs.extend(docs)
+
+    def search(self, query, k=3):
+        words = set(query.lower().split())
+        scored = [(doc, len(words & set(doc["text"].lower().split()))) for doc in self.docs]
+        return sorted(scored, key=lambda pair: -pair[1])[:k]
+
+
+@pytest.fixture
+def stub_embeddings(monkeypatch):
+    StubIndex.built = 0
+    monkeypatch.setitem(sys.modules, "embeddings", types.SimpleNamespace(EmbeddingIndex=StubIndex))
+    return StubIndex
+
+
+def _ask(timeline):
+    return reporter.query_tactic("Discovery", timeline, lambda q: [], "m", incident_id="inc")
+
+
+def test_answer_cached_for_same_timeline(llm):
+    assert _ask(["scan from 10.0.0.5"]) == "answer#1"
+    assert _ask(["scan from 10.0.0.5"]) == "answer#1"
+    assert len(llm) == 1
+
+
+def test_changed_timeline_of_same_length_is_requeried(llm):
+    assert _ask(["scan from 10.0.0.5"]) == "answer#1"
+    assert _ask(["beacon to 203.0.113.9"]) == "answer#2"
+    assert "beacon to 203.0.113.9" in llm[1]
+
+
+def test_answer_cache_is_bounded(llm, monkeypatch):
+    monkeypatch.setattr(reporter, "MAX_CACHED_ANSWERS", 2)
+    for i in range(5):
+        _ask([f"segment {i}"])
+    assert len(reporter._answers) == 2
+
+
+def test_selected_segments_fit_budget_in_timeline_order():
+    timeline = ["port scan alpha", "x " * 200, "port scan beta", "dns lookup"]
+    index = StubIndex()
+    index.add_docs([{"id": i, "text": t} for i, t in enumerate(timeline)])
+
+    # The long filler segment is ranked but no longer fits once a scan is chosen
+    chosen = reporter.select_segments("port scan", timeline, budget=20, index=index, top_k=3)
+    assert chosen == ["port scan alpha", "port scan beta"]
+    assert sum(map(reporter.estimate_tokens, chosen)) <= 20
+
+
+def test_oversized_first_segment_is_clipped():
+    timeline = ["y " * 400]
+    chosen = reporter.select_segments("anything", timeline, budget=10)
+    assert chosen[0].endswith("...[truncated]")
+    assert len(chosen[0]) <= 10 * reporter.CHARS_PER_TOKEN + len(" ...[truncated]")
+
+
+def test_without_index_earliest_segments_are_used():
+    timeline = [f"segment {i}" for i in range(10)]
+    assert reporter.select_segments("t", timeline, budget=1000, top_k=3) == timeline[:3]
+
+
+def test_prompt_stays_under_token_budget(llm, stub_embeddings):
+    timeline = [{"summary": f"host 10.0.0.{i} discovery sweep " + "z " * 50, "mapping": "Discovery"}
+                for i in range(200)]
+    context = ["reference " * 500]
+    reporter.query_tactic("Discovery sweep", timeline, lambda q: context, "m",
+                          incident_id="inc", encoder=object(), top_k=8, token_budget=600)
+
+    prompt = llm[0]
+    assert reporter.estimate_tokens(prompt) <= 600
+    assert "host 10.0.0.0 discovery" in prompt
+    assert "host 10.0.0.199" not in prompt
+
+
+def test_segments_embedded_once_per_timeline_content(llm, stub_embeddings):
+    timeline = ["scan from 10.0.0.5", "beacon to 203.0.113.9"]
+    for tactic in ("Discovery", "Command and Control"):
+        reporter.query_tactic(tactic, timeline, lambda q: [], "m", incident_id="inc", encoder=object())
+    assert stub_embeddings.built == 1
+
+    reporter.query_tactic("Discovery", timeline + ["new segment"], lambda q: [], "m",
+                          incident_id="inc", encoder=object())
+    assert stub_embeddings.built == 2
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+import utils
+
+
+def _wait(job_ids):
+    for _ in range(100):
+        if all(utils.REPORT_JOBS.get(j, {}).get("status") != "running" for j in job_ids):
+            return
+        time.sleep(0.05)
+
+
+def test_report_jobs_are_bounded_and_files_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "REPORT_JOBS", utils.OrderedDict())
+    monkeypatch.setattr(utils, "REPORT_MAX_JOBS", 3)
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"report_{i}.csv"
+        job = utils.render_report_async({"Failed Connection": 1}, ["line"], fmt="csv",
+                                        output_path=str(path))
+        _wait([job])
+        paths.append(path)
+
+    assert len(utils.REPORT_JOBS) == 3
+    assert [p.exists() for p in paths] == [False, False, True, True, True]
+
+
+def test_expired_report_jobs_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "REPORT_JOBS", utils.OrderedDict())
+    monkeypatch.setattr(utils, "REPORT_JOB_TTL", 0)
+    old = tmp_path / "old.csv"
+    job = utils.render_report_async({}, ["line"], fmt="csv", output_path=str(old))
+    _wait([job])
+    new = utils.render_report_async({}, ["line"], fmt="csv", output_path=str(tmp_path / "new.csv"))
+
+    assert list(utils.REPORT_JOBS) == [new]
+    assert not old.exists()
+
+
+def test_unknown_report_format_is_rejected_before_a_job_starts(monkeypatch):
+    monkeypatch.setattr(utils, "REPORT_JOBS", utils.OrderedDict())
+    with pytest.raises(ValueError, match="Unsupported export format"):
+        utils.render_report_async({}, ["line"], fmt="docx")
+    assert not utils.REPORT_JOBS
+
+
+def test_pdf_timeline_is_capped(tmp_path):
+    timeline = [f"2025-01-01 00:00:{i:02} | Failed Connection | entry-{i}" for i in range(12)]
+    path = utils.generate_pdf_report({"Failed Connection": 12}, timeline,
+                                     output_path=str(tmp_path / "capped.pdf"), max_timeline=5)
+    text = utils.extract_text_from_pdf(path)
+
+    assert "entry-4" in text
+    assert "entry-5" not in text
+    assert "7 more entries omitted" in text
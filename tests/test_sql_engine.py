@@ -0,0 +1,55 @@
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+from agents import analyzer, sql_engine
+from agents.collector import collect_logs
+from bench.synth import ATTACKS, write_dataset
+
+
+@pytest.fixture(scope="module")
+def ndjson(tmp_path_factory):
+    out = tmp_path_factory.mktemp("synth")
+    write_dataset(str(out), 20_000, fmt="ndjson", seed=3, attacks=ATTACKS)
+    return str(out / "synthetic.json")
+
+
+def _sql_alerts(path, rules, tmp_path):
+    con = sql_engine.connect(path, temp_directory=str(tmp_path / "duckdb"))
+    try:
+        return sql_engine.generate_alerts(None, con=con, rules=rules)
+    finally:
+        sql_engine.close(con)
+
+
+def _comparable(alerts):
+    # Rogue DHCP is stamped with the wall clock, not a log timestamp
+    alerts = alerts[alerts["type"] != "Rogue DHCP Server"]
+    alerts = alerts[["ts", "type", "desc"]].astype(str)
+    return alerts.sort_values(["type", "ts", "desc"], ignore_index=True)
+
+
+def test_sql_rules_match_analyzer(ndjson, tmp_path):
+    df, _ = collect_logs(ndjson)
+    expected = analyzer.generate_alerts(df)
+    alerts = _sql_alerts(ndjson, "analyzer", tmp_path)
+
+    assert str(alerts["ts"].dt.tz) == "UTC"
+    assert {"High Data Transfer", "Vertical Port Scan", "Beaconing"} <= set(alerts["type"])
+    pd.testing.assert_frame_equal(_comparable(alerts), _comparable(expected))
+
+
+def test_sql_rules_match_analyzer2(ndjson, tmp_path):
+    pytest.importorskip("networkx")
+    from agents import analyzer2
+
+    df, _ = collect_logs(ndjson)
+    expected = analyzer2.generate_alerts(df)
+    # analyzer2 passes the collector's ISO strings through unparsed
+    expected["ts"] = pd.to_datetime(expected["ts"], utc=True)
+    alerts = _sql_alerts(ndjson, "analyzer2", tmp_path)
+
+    pd.testing.assert_frame_equal(_comparable(alerts), _comparable(expected))
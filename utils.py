@@ -10,10 +10,13 @@ import gzip
 import io
 import re
 import textwrap
+from metrics import stage, OLLAMA_LATENCY
 
 def ollama_complete(prompt, model="mistral", tokens=400):
     cmd = ["ollama", "run", model, "--num-predict", str(tokens)]
-    proc = subprocess.run(cmd, input=prompt, text=True, capture_output=True)
+    with stage("llm", rows_in=1) as s, OLLAMA_LATENCY.time(model=model):
+        proc = subprocess.run(cmd, input=prompt, text=True, capture_output=True)
+        s.rows_out = 1
     return proc.stdout.strip()
 
 def extract_text_from_pdf(pdf_path):
@@ -72,74 +75,168 @@ def load_zeek_logs(path: str) -> pd.DataFrame:
 
 from fpdf import FPDF
 from datetime import datetime
+from collections import OrderedDict
+from itertools import islice
+from threading import Thread, Lock
+import html
+import csv
 import os
 import re
 import textwrap
+import time
+import uuid
 
-def generate_pdf_report(summary, timeline, stats=None, output_path=None):
+REPORT_TOP_N = 15
+REPORT_MAX_TIMELINE = 500
+REPORT_MAX_TEXT = 1000
+
+# Compiled once; reused for every line of every report
+_NON_PRINTABLE = re.compile(r"[^\x20-\x7E]")
+_LONG_TOKEN = re.compile(r"(\S{120})(?=\S)")
+_WRAPPER = textwrap.TextWrapper(width=100)
+
+
+def sanitize_text(text, max_total_len=REPORT_MAX_TEXT):
+    """
+    Make text safe for the core PDF fonts: ASCII only, truncated, and with
+    breakpoints inside long unbroken tokens.
+    """
+    if not isinstance(text, str):
+        text = str(text)
+    if len(text) > max_total_len:
+        text = text[:max_total_len] + " ...[truncated]"
+    text = _NON_PRINTABLE.sub("?", text)
+    text = _LONG_TOKEN.sub(r"\1 ", text)
+    return "\n".join(_WRAPPER.wrap(text))
+
+
+def _timeline_line(event):
+    """
+    One-line rendering of a timeline entry (plain string or analyzer2 segment).
+    """
+    if isinstance(event, dict):
+        return f"{event.get('start', '')} | {event.get('summary', '')}"
+    return str(event)
+
+
+def top_n_rows(counts, top_n=REPORT_TOP_N):
+    """
+    Sort a {label: count} mapping and fold everything past `top_n` into 'Other'.
     """
-    SOC Incident Timeline Report using fpdf2 (UTF-8, safe wrapping, no overflow).
+    items = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)
+    rows = [(str(k), v) for k, v in items[:top_n]]
+    rest = items[top_n:]
+    if rest:
+        rows.append((f"Other ({len(rest)})", sum(v for _, v in rest)))
+    return rows
+
+
+def aggregate_tables(alerts, top_n=REPORT_TOP_N):
     """
+    Aggregated top-N tables over an alerts DataFrame.
+    """
+    tables = {}
+    if alerts is None or alerts.empty:
+        return tables
+    for title, col in [("Top Sources", "id.orig_h"),
+                       ("Top Destinations", "id.resp_h"),
+                       ("Alert Types", "type")]:
+        if col in alerts:
+            tables[title] = top_n_rows(alerts[col].value_counts().to_dict(), top_n)
+    if "ts" in alerts:
+        hours = pd.to_datetime(alerts["ts"], errors="coerce").dt.floor("h")
+        per_hour = hours.value_counts().sort_values(ascending=False)
+        tables["Busiest Hours"] = [(str(k), v) for k, v in per_hour.head(top_n).items()]
+    return tables
+
+
+def _pdf_table(pdf, title, rows, headings=("Item", "Count")):
+    pdf.set_font("Helvetica", "B", 12)
+    pdf.cell(0, 8, title, ln=True)
+    pdf.set_font("Helvetica", "", 10)
+    with pdf.table(col_widths=(140, 40), text_align=("LEFT", "RIGHT")) as table:
+        table.row(headings)
+        for label, count in rows:
+            table.row((sanitize_text(label, 200), str(count)))
+    pdf.ln(4)
+
+
+def generate_pdf_report(summary, timeline, stats=None, output_path=None,
+                        alerts=None, summary_text=None,
+                        top_n=REPORT_TOP_N, max_timeline=REPORT_MAX_TIMELINE):
+    """
+    SOC Incident Timeline Report using fpdf2.
+    Summary and aggregates are rendered as top-N tables and the timeline is
+    capped at `max_timeline` entries, so render time is bounded regardless
+    of alert count. Use `export_report` for the full listing.
+    """
+    with stage("pdf", rows_in=len(timeline or [])) as s:
+        output_path = _render_pdf(summary, timeline, stats, output_path, alerts,
+                                  summary_text, top_n, max_timeline)
+        s.rows_out = min(len(timeline or []), max_timeline)
+    return output_path
+
+
+def _render_pdf(summary, timeline, stats, output_path, alerts, summary_text,
+                top_n, max_timeline):
     pdf = FPDF()
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.set_font("Helvetica", "", 12)
-
-    # Utility: sanitize and wrap long lines safely
-    def sanitize_text(text, max_line_len=100, max_total_len=1000):
-        if not isinstance(text, str):
-            text = str(text)
-        # Remove non-printable and high-Unicode chars
-        text = re.sub(r"[^\x20-\x7E]", "?", text)
-        # Truncate pathological logs
-        if len(text) > max_total_len:
-            text = text[:max_total_len] + " ...[truncated]"
-        # Add breakpoints inside long continuous tokens (no spaces)
-        text = re.sub(r"(\S{120})(?=\S)", r"\1 ", text)
-        # Final wrap for visual readability
-        return "\n".join(textwrap.wrap(text, max_line_len))
 
     # --- Title ---
     pdf.set_font("Helvetica", "B", 16)
     pdf.cell(0, 10, "SOC Incident Timeline Report", ln=True, align="C")
-
     pdf.set_font("Helvetica", "", 12)
     pdf.cell(0, 10, f"Generated: {datetime.utcnow():%Y-%m-%d %H:%M:%S UTC}", ln=True)
     pdf.ln(5)
 
-    # --- Summary ---
-    pdf.set_font("Helvetica", "B", 14)
-    pdf.cell(0, 10, "Alert Summary", ln=True)
-    pdf.set_font("Helvetica", "", 11)
-    if not summary:
-        pdf.multi_cell(0, 2, "No alerts detected.")
-    else:
-        for k, v in summary.items():
-            line = sanitize_text(f"{k}: {v}")
-            safe_multicell(pdf, line)
-            # pdf.multi_cell(0, 8, line)
-    pdf.ln(5)
-
-    # --- Stats ---
-    if isinstance(stats, dict) and stats:
+    # --- Narrative summary (summarizer output) ---
+    if summary_text:
         pdf.set_font("Helvetica", "B", 14)
-        pdf.cell(0, 2, "Dataset Stats", ln=True)
+        pdf.cell(0, 10, "Summary of Findings", ln=True)
         pdf.set_font("Helvetica", "", 11)
-        for k, v in stats.items():
-            line = sanitize_text(f"{k}: {v}")
-            pdf.multi_cell(0, 2, line)
+        pdf.multi_cell(0, 6, sanitize_text(summary_text, REPORT_MAX_TEXT * 4),
+                       new_x="LMARGIN", new_y="NEXT")
         pdf.ln(5)
 
-    # --- Timeline ---
-    pdf.set_font("Helvetica", "B", 14)
-    pdf.cell(0, 10, "Incident Timeline", ln=True)
-    pdf.set_font("Helvetica", "", 10)
-    if not timeline:
-        pdf.multi_cell(0, 2, "No timeline entries found.")
-    else:
-        for i, event in enumerate(timeline, 1):
-            clean = sanitize_text(f"{i}. {event}")
-            pdf.multi_cell(0, 2, clean)
+    # --- Alert summary (None skips the section) ---
+    if summary is not None:
+        pdf.set_font("Helvetica", "B", 14)
+        pdf.cell(0, 10, "Alert Summary", ln=True)
+        if not summary:
+            pdf.set_font("Helvetica", "", 11)
+            pdf.multi_cell(0, 6, "No alerts detected.", new_x="LMARGIN", new_y="NEXT")
+            pdf.ln(5)
+        else:
+            _pdf_table(pdf, f"Top {top_n} alert types", top_n_rows(summary, top_n),
+                       ("Alert type", "Count"))
+
+    # --- Aggregates ---
+    for title, rows in aggregate_tables(alerts, top_n).items():
+        if title != "Alert Types":
+            _pdf_table(pdf, title, rows)
+
+    # --- Stats ---
+    if isinstance(stats, dict) and stats:
+        _pdf_table(pdf, "Dataset Stats", [(k, sanitize_text(v, 200)) for k, v in stats.items()],
+                   ("Field", "Value"))
+
+    # --- Timeline (None skips the section) ---
+    if timeline is not None:
+        pdf.set_font("Helvetica", "B", 14)
+        pdf.cell(0, 10, "Incident Timeline", ln=True)
+        pdf.set_font("Helvetica", "", 9)
+        if not timeline:
+            pdf.multi_cell(0, 5, "No timeline entries found.", new_x="LMARGIN", new_y="NEXT")
+        else:
+            for i, event in enumerate(islice(timeline, max_timeline), 1):
+                pdf.multi_cell(0, 5, sanitize_text(f"{i}. {_timeline_line(event)}"),
+                               new_x="LMARGIN", new_y="NEXT")
+            if len(timeline) > max_timeline:
+                pdf.set_font("Helvetica", "I", 9)
+                pdf.multi_cell(0, 5, f"... {len(timeline) - max_timeline} more entries omitted "
+                                     "(see HTML/CSV export for the full timeline).",
+                               new_x="LMARGIN", new_y="NEXT")
     pdf.ln(10)
 
     # --- Footer ---
@@ -155,7 +252,114 @@ def generate_pdf_report(summary, timeline, stats=None, output_path=None):
     print(f"[INFO] PDF report generated: {output_path}")
     return output_path
 
-def print_timeline_to_terminal(summary, timeline, stats=None):
+
+def export_report(summary, timeline, alerts=None, fmt="html", output_path=None,
+                  top_n=REPORT_TOP_N):
+    """
+    Fast full-fidelity export. 'csv' streams every alert (or timeline entry);
+    'html' writes the top-N tables plus the uncapped timeline.
+    """
+    os.makedirs("store", exist_ok=True)
+    output_path = output_path or os.path.join(
+        "store", f"soc_timeline_{datetime.utcnow():%Y%m%d_%H%M%S}.{fmt}"
+    )
+
+    if fmt == "csv":
+        if alerts is not None and not alerts.empty:
+            alerts.to_csv(output_path, index=False)
+        else:
+            with open(output_path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["n", "entry"])
+                writer.writerows((i, _timeline_line(e)) for i, e in enumerate(timeline or [], 1))
+    elif fmt == "html":
+        tables = {"Alert Summary": top_n_rows(summary or {}, top_n)}
+        tables.update(aggregate_tables(alerts, top_n))
+        with open(output_path, "w") as f:
+            f.write("<html><head><meta charset='utf-8'><title>SOC Incident Report</title>"
+                    "</head><body><h1>SOC Incident Timeline Report</h1>")
+            f.write(f"<p>Generated: {datetime.utcnow():%Y-%m-%d %H:%M:%S UTC}</p>")
+            for title, rows in tables.items():
+                f.write(f"<h2>{html.escape(title)}</h2><table border='1'>")
+                f.writelines(f"<tr><td>{html.escape(str(k))}</td><td>{v}</td></tr>" for k, v in rows)
+                f.write("</table>")
+            f.write("<h2>Incident Timeline</h2><ol>")
+            f.writelines(f"<li>{html.escape(_timeline_line(e))}</li>" for e in timeline or [])
+            f.write("</ol></body></html>")
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    print(f"[INFO] {fmt.upper()} report exported: {output_path}")
+    return output_path
+
+
+# ----------------------------------------------------------
+# Background rendering
+# ----------------------------------------------------------
+REPORT_FORMATS = ("pdf", "html", "csv")
+REPORT_JOBS = OrderedDict()
+REPORT_MAX_JOBS = 50
+REPORT_JOB_TTL = 3600  # seconds a finished job and its file are kept
+_REPORT_JOBS_LOCK = Lock()
+
+
+def _evict_report_jobs(now):
+    """
+    Drop finished jobs past the TTL or beyond REPORT_MAX_JOBS (oldest first)
+    and delete their output files. Running jobs are never evicted.
+    Call with _REPORT_JOBS_LOCK held.
+    """
+    finished = [j for j, job in REPORT_JOBS.items() if job["status"] != "running"]
+    excess = len(REPORT_JOBS) - REPORT_MAX_JOBS + 1  # room for the job being added
+    for job_id in finished:
+        job = REPORT_JOBS[job_id]
+        if excess <= 0 and now - job["created"] < REPORT_JOB_TTL:
+            continue
+        REPORT_JOBS.pop(job_id)
+        excess -= 1
+        path = job.get("path")
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"[WARN] Could not remove expired report {path}: {e}")
+
+
+def _run_report_job(job_id, fmt, args, kwargs):
+    try:
+        if fmt == "pdf":
+            path = generate_pdf_report(*args, **kwargs)
+        else:
+            path = export_report(*args, fmt=fmt, **kwargs)
+        update = {"status": "done", "path": path}
+    except Exception as e:
+        update = {"status": "error", "error": str(e)}
+    with _REPORT_JOBS_LOCK:
+        if job_id in REPORT_JOBS:
+            REPORT_JOBS[job_id].update(update)
+
+
+def render_report_async(*args, fmt="pdf", **kwargs):
+    """
+    Render a report on a daemon thread so the request thread returns at once.
+    Returns a job id; poll REPORT_JOBS[job_id] for status and output path.
+    Finished jobs and their files are kept for REPORT_JOB_TTL seconds, and
+    at most REPORT_MAX_JOBS jobs are tracked. Raises ValueError for a
+    format outside REPORT_FORMATS before any job is started.
+    """
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    job_id = uuid.uuid4().hex
+    kwargs.setdefault("output_path", os.path.join("store", f"soc_report_{job_id}.{fmt}"))
+    now = time.time()
+    with _REPORT_JOBS_LOCK:
+        _evict_report_jobs(now)
+        REPORT_JOBS[job_id] = {"status": "running", "format": fmt, "created": now,
+                               "path": kwargs["output_path"]}
+    Thread(target=_run_report_job, args=(job_id, fmt, args, kwargs), daemon=True).start()
+    return job_id
+
+def print_timeline_to_terminal(summary, timeline, stats=None, max_entries=REPORT_MAX_TIMELINE):
     """
     Print SOC incident summary and timeline to the terminal
     instead of generating a PDF.
@@ -181,6 +385,8 @@ def print_timeline_to_terminal(summary, timeline, stats=None):
         print("No timeline entries found.")
     else:
         print("Incident Timeline:")
-        for i, event in enumerate(timeline, 1):
-            print(f"{i:03}. {event}")
+        for i, event in enumerate(islice(timeline, max_entries), 1):
+            print(f"{i:03}. {_timeline_line(event)}")
+        if len(timeline) > max_entries:
+            print(f"... {len(timeline) - max_entries} more entries omitted")
     print("\n" + "=" * 60)